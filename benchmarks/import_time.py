@@ -0,0 +1,80 @@
+import os
+import re
+import sys
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+FUNCTIONS_DIR = os.path.join(ROOT, "functions")
+LAYERS_DIR = os.path.join(ROOT, "layers")
+
+ENV_VAR = re.compile(r"""os\.environ(?:\.get\(|\[)\s*["']([A-Z0-9_]+)["']""")
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def stub_env(source):
+    # required variables get a placeholder, optional ones keep their defaults
+    env = {
+        name: "stub"
+        for name in ENV_VAR.findall(source)
+        if f'os.environ["{name}"]' in source
+    }
+    env.setdefault("AWS_REGION", "us-east-1")
+    env["AWS_DEFAULT_REGION"] = env["AWS_REGION"]
+    return env
+
+
+def import_times(function):
+    function_dir = os.path.join(FUNCTIONS_DIR, function)
+    with open(os.path.join(function_dir, "lambda_function.py")) as file:
+        source = file.read()
+
+    layers = [
+        os.path.join(LAYERS_DIR, layer) for layer in sorted(os.listdir(LAYERS_DIR))
+    ]
+    env = {
+        **os.environ,
+        **stub_env(source),
+        "PYTHONPATH": os.pathsep.join([function_dir, *layers]),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import lambda_function"],
+        cwd=function_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if match := IMPORT_TIME.match(line):
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append((module, int(self_us), int(cumulative_us), len(indent)))
+    error = result.stderr.strip().splitlines()[-1] if result.returncode else None
+    return modules, error
+
+
+def main(top=5):
+    functions = sorted(os.listdir(FUNCTIONS_DIR))
+    print(f"{'function':<22} {'total':>10}  slowest imports (cumulative)")
+    for function in functions:
+        modules, error = import_times(function)
+        if error:
+            print(f"{function:<22} {'failed':>10}  {error}")
+            continue
+        # the modules imported directly by the function, which -X importtime lists
+        # before the function itself, one level deeper
+        position = next(i for i, m in enumerate(modules) if m[0] == "lambda_function")
+        _, _, total, depth = modules[position]
+        direct = []
+        for module in reversed(modules[:position]):
+            if module[3] <= depth:
+                break
+            if module[3] == depth + 2:
+                direct.append(module)
+        direct.sort(key=lambda m: m[2], reverse=True)
+        slowest = ", ".join(f"{m[0]} {m[2] / 1000:.1f}" for m in direct[:top])
+        print(f"{function:<22} {total / 1000:8.1f}ms  {slowest}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
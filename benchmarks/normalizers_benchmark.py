@@ -0,0 +1,62 @@
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), os.pardir, "layers", "helper")
+)
+
+import inflect
+import normalizers
+
+WORDS = """
+    water leaking from the ceiling tiles in bathrooms near the stairs broken lights
+    and outlets sparking in classrooms clogged sinks toilets drains heaters making
+    noises windows cracked glass doors stuck locks jammed elevators out of service
+    projectors printers wifi outages mice in the walls mold stains on floors
+    """.split()
+
+# the inline normalization the detect functions used before the shared module
+engine = inflect.engine()
+
+
+def baseline_normalize(text):
+    words = []
+    for word in text.split(" "):
+        word = word.lower().strip()
+        words.append(singular if (singular := engine.singular_noun(word)) else word)
+    return words
+
+
+def descriptions(count, length, seed=0):
+    generator = random.Random(seed)
+    return [
+        " ".join(generator.choice(WORDS) for _ in range(length)) for _ in range(count)
+    ]
+
+
+def run(name, normalize, texts, repeat):
+    seconds = min(
+        timeit.repeat(
+            lambda: [normalize(text) for text in texts], number=1, repeat=repeat
+        )
+    )
+    words = sum(len(text.split(" ")) for text in texts)
+    print(f"{name:<24} {seconds * 1000:9.2f} ms {words / seconds:12.0f} words/s")
+
+
+def main(count=500, length=60, repeat=5):
+    texts = descriptions(count, length)
+    print(f"Normalizing {count} descriptions of {length} words, best of {repeat}")
+
+    run("inflect per word", baseline_normalize, texts, repeat)
+
+    normalizers.singularize.cache_clear()
+    run("normalize_words (cold)", normalizers.normalize_words, texts, 1)
+    run("normalize_words (warm)", normalizers.normalize_words, texts, repeat)
+    print(f"singularize cache: {normalizers.singularize.cache_info()}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
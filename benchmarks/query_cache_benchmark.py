@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import itertools
+import statistics
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), os.pardir, "layers", "opensearch")
+)
+
+from opensearch import opensearch
+from queries import REPORT_SOURCE_FIELDS, reports_query, search_body
+
+AWS_REGION = os.environ["AWS_REGION"]
+DOMAIN_ENDPOINT = os.environ["DOMAIN_ENDPOINT"]
+DOMAIN_PORT = os.environ.get("DOMAIN_PORT", 443)
+
+PAGE_SIZE = 20
+SORT = [{"_score": "desc"}, {"reportID": "asc"}]
+
+
+# the body query-reports built before the shared query compiler, with the sort of
+# the compiled body so the two only differ in how the query is built
+def legacy_reports_body(
+    query=None, user_id=None, building=None, status=None, only_ungrouped=False
+):
+    must_clauses = []
+    if user_id:
+        must_clauses.append({"term": {"userID": user_id}})
+    if building:
+        must_clauses.append({"term": {"building": building}})
+    if status:
+        must_clauses.append({"term": {"status": status}})
+    if query:
+        must_clauses.append(
+            {
+                "query_string": {
+                    "query": query,
+                    "fields": [
+                        "title^4",
+                        "keywords^4",
+                        "photoLabels^2",
+                        "building^2",
+                        "description",
+                    ],
+                }
+            }
+        )
+
+    must_not_clauses = []
+    if only_ungrouped:
+        must_not_clauses.append({"exists": {"field": "groupID"}})
+
+    return {
+        "from": 0,
+        "size": PAGE_SIZE,
+        "query": {"bool": {"must": must_clauses, "must_not": must_not_clauses}},
+        "sort": SORT,
+    }
+
+
+def compiled_reports_body(**filters):
+    body = search_body(reports_query(**filters), PAGE_SIZE, REPORT_SOURCE_FIELDS)
+    return {**body, "sort": SORT, "from": 0}
+
+
+def filter_combinations(search):
+    response = search.search(
+        index="reports",
+        body={
+            "size": 0,
+            "aggs": {
+                "building": {"terms": {"field": "building", "size": 5}},
+                "status": {"terms": {"field": "status", "size": 5}},
+            },
+        },
+    )
+    buildings = [b["key"] for b in response["aggregations"]["building"]["buckets"]]
+    statuses = [b["key"] for b in response["aggregations"]["status"]["buckets"]]
+    return [
+        {"building": building, "status": status, "only_ungrouped": only_ungrouped}
+        for building, status, only_ungrouped in itertools.product(
+            [None, *buildings], [None, *statuses], [False, True]
+        )
+    ]
+
+
+def cache_stats(search):
+    stats = search.indices.stats(index="reports", metric="request_cache,query_cache")
+    total = stats["_all"]["total"]
+    return {
+        "request_cache": total["request_cache"],
+        "query_cache": total["query_cache"],
+    }
+
+
+def hit_rate(before, after, cache):
+    hits = after[cache]["hit_count"] - before[cache]["hit_count"]
+    misses = after[cache]["miss_count"] - before[cache]["miss_count"]
+    return f"{hits}/{hits + misses} ({hits / max(1, hits + misses):.0%})"
+
+
+def run(search, name, bodies, rounds, request_cache):
+    search.indices.clear_cache(index="reports", query=True, request=True)
+    before = cache_stats(search)
+
+    latencies, took = [], []
+    for _ in range(rounds):
+        for body in bodies:
+            started = time.perf_counter()
+            response = search.search(
+                index="reports", body=body, request_cache=request_cache
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            took.append(response["took"])
+
+    after = cache_stats(search)
+    quantiles = statistics.quantiles(latencies, n=20)
+    print(
+        f"{name:<11} p50 {statistics.median(latencies):7.1f} ms  "
+        f"p95 {quantiles[18]:7.1f} ms  took {statistics.mean(took):6.1f} ms  "
+        f"request cache {hit_rate(before, after, 'request_cache')}  "
+        f"query cache {hit_rate(before, after, 'query_cache')}"
+    )
+
+
+def main(rounds=20):
+    search = opensearch(AWS_REGION, DOMAIN_ENDPOINT, DOMAIN_PORT)
+    combinations = filter_combinations(search)
+    print(f"Running {len(combinations)} filter combinations {rounds} times each")
+
+    # both body sets run with the default request cache setting, so their rows
+    # compare the bodies alone; the last row adds the flag query-reports sends
+    legacy_bodies = [legacy_reports_body(**filters) for filters in combinations]
+    compiled_bodies = [compiled_reports_body(**filters) for filters in combinations]
+    run(search, "legacy", legacy_bodies, rounds, request_cache=None)
+    run(search, "compiled", compiled_bodies, rounds, request_cache=None)
+    run(search, "compiled+rc", compiled_bodies, rounds, request_cache=True)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
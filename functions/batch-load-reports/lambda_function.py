@@ -1,69 +1,348 @@
 import json
-import boto3
+import time
 import os
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from clients import client, dynamodb, s3, search
+from documents import report_document
+from logs import log_event, logger
+from metrics import with_metrics
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
+CHECKPOINT_TABLE_NAME = os.environ.get("CHECKPOINT_TABLE_NAME", REPORTS_TABLE_NAME)
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", 8))
+RANGE_SIZE = int(os.environ.get("RANGE_SIZE", 16 * 1024 * 1024))
+READ_CHUNK_SIZE = 1024 * 1024
+CHECKPOINT_LINES = int(os.environ.get("CHECKPOINT_LINES", 5000))
+TIMEOUT_MARGIN_MS = int(os.environ.get("TIMEOUT_MARGIN_MS", 60 * 1000))
+
+# backfill mode also indexes every loaded report directly into OpenSearch
+BACKFILL_INDEX = os.environ.get("BACKFILL_INDEX", "false").lower() == "true"
+BACKFILL_DISABLE_REFRESH = (
+    os.environ.get("BACKFILL_DISABLE_REFRESH", "false").lower() == "true"
+)
 
 SUBMITTED_STATUS = "SUBMITTED"
 PROCESSING_STATUS = "PROCESSING"
 RESOLVED_STATUS = "RESOLVED"
 
-s3 = boto3.client("s3")
-dynamodb = boto3.resource("dynamodb")
+# every worker holds one S3 stream at a time on the shared S3 client
+POOL_CONNECTIONS = 2 * MAX_WORKERS
 
+# the workers outlive the invocation, so each keeps its own DynamoDB resource
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
 
-def lambda_handler(event, context):
-    # Get the S3 bucket and object key from the event
-    bucket = event["Records"][0]["s3"]["bucket"]["name"]
-    key = event["Records"][0]["s3"]["object"]["key"]
-
-    print(f"Processing file {key} ...")
-
-    # Download the JSON file from the S3 bucket
-    s3_object = s3.get_object(Bucket=bucket, Key=key)
-    s3_iterator = s3_object["Body"].iter_lines()
-
-    # Define the DynamoDB table
-    table = dynamodb.Table(REPORTS_TABLE_NAME)
-
-    # Parse the JSON file and batch write them to DynamoDB
-    entries_count = 0
-    with table.batch_writer() as batch:
-        for i, entry in enumerate(s3_iterator):
-            if i != 0 and i % 50 == 0:
-                print(f"Processed {i} entries ...")
-
-            entry = json.loads(entry)
-
-            if not entry["ID"].startswith("RPT-"):
-                entry["ID"] = f"RPT-{entry['ID']}"
-            report = {
-                "ID": entry["ID"],
-                "title": entry["title"],
-                "building": entry["building"],
-                "description": entry["description"].capitalize(),
-                "createdDate": entry["createdDate"],
-                "imageKeys": [],
-                "userID": entry["userID"],
-            }
-            if keywords := entry.get("keywords"):
-                report["keywords"] = set(keywords)
-            if photo_labels := entry.get("photoLabels"):
-                report["photoLabels"] = set(photo_labels)
-            report["status"] = (
-                status
-                if (status := entry.get("status"))
-                in [SUBMITTED_STATUS, PROCESSING_STATUS, RESOLVED_STATUS]
-                else SUBMITTED_STATUS
+
+def parse_report(entry):
+    entry = json.loads(entry)
+
+    if not entry["ID"].startswith("RPT-"):
+        entry["ID"] = f"RPT-{entry['ID']}"
+    report = {
+        "ID": entry["ID"],
+        "title": entry["title"],
+        "building": entry["building"],
+        "description": entry["description"].capitalize(),
+        "createdDate": entry["createdDate"],
+        "imageKeys": [],
+        "userID": entry["userID"],
+    }
+    if keywords := entry.get("keywords"):
+        report["keywords"] = set(keywords)
+    if photo_labels := entry.get("photoLabels"):
+        report["photoLabels"] = set(photo_labels)
+    report["status"] = (
+        status
+        if (status := entry.get("status"))
+        in [SUBMITTED_STATUS, PROCESSING_STATUS, RESOLVED_STATUS]
+        else SUBMITTED_STATUS
+    )
+    return report
+
+
+def load_version():
+    # a reloaded report replaces the existing item, so its version starts from the
+    # load time in milliseconds rather than 1; it stays above the version of the
+    # item it replaces, whether counted from 1 or from an earlier load, and an
+    # etag built from an older version is never matched again
+    return time.time_ns() // 1_000_000
+
+
+def iter_lines(chunks, offset):
+    # yield every line with the byte offset it starts at
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield offset, line
+            offset += len(line) + 1
+    if pending:
+        yield offset, pending
+
+
+def index_reports(reports):
+    actions = []
+    for report in reports:
+        actions.append({"index": {"_index": "reports", "_id": report["ID"]}})
+        actions.append(report_document(report))
+    response = search().bulk(body=actions)
+    if response["errors"]:
+        errors = [
+            item["index"] for item in response["items"] if "error" in item["index"]
+        ]
+        raise Exception(f"Failed to index {len(errors)} reports: {errors[:5]}")
+
+
+def disable_refresh():
+    response = search().indices.get_settings(
+        index="reports", name="index.refresh_interval"
+    )
+    refresh_interval = (
+        response.get("reports", {})
+        .get("settings", {})
+        .get("index", {})
+        .get("refresh_interval")
+    )
+    search().indices.put_settings(
+        index="reports", body={"index": {"refresh_interval": "-1"}}
+    )
+    logger.info(f"Disabled refresh on reports index, previously {refresh_interval}")
+    # refresh may already be disabled by a concurrent load, restore the default then
+    return None if refresh_interval == "-1" else refresh_interval
+
+
+def restore_refresh(refresh_interval):
+    search().indices.put_settings(
+        index="reports", body={"index": {"refresh_interval": refresh_interval}}
+    )
+    logger.info(f"Restored refresh on reports index to {refresh_interval}")
+
+
+def checkpoint_id(bucket, key, start):
+    return f"LOAD-{bucket}/{key}#{start}"
+
+
+def get_checkpoint(bucket, key, etag, start):
+    checkpoints_table = dynamodb().Table(CHECKPOINT_TABLE_NAME)
+    response = checkpoints_table.get_item(Key={"ID": checkpoint_id(bucket, key, start)})
+    # a checkpoint for another version of the object is stale
+    if (checkpoint := response.get("Item")) and checkpoint["etag"] == etag:
+        return checkpoint
+    return {}
+
+
+def save_checkpoint(bucket, key, etag, start, end, offset, line, done):
+    checkpoints_table = dynamodb().Table(CHECKPOINT_TABLE_NAME)
+    checkpoints_table.put_item(
+        Item={
+            "ID": checkpoint_id(bucket, key, start),
+            "objectKey": key,
+            "etag": etag,
+            "start": start,
+            "end": end,
+            "offset": offset,
+            "line": line,
+            "done": done,
+        }
+    )
+
+
+def delete_checkpoints(bucket, key, starts):
+    checkpoints_table = dynamodb().Table(CHECKPOINT_TABLE_NAME)
+    with checkpoints_table.batch_writer() as batch:
+        for start in starts:
+            batch.delete_item(Key={"ID": checkpoint_id(bucket, key, start)})
+
+
+def load_range(bucket, key, etag, start, end, out_of_time):
+    # load the lines starting within [start, end), the line crossing end is read
+    # to completion and a line crossing start is left to the previous range
+    checkpoint = get_checkpoint(bucket, key, etag, start)
+    if checkpoint.get("done"):
+        return 0, 0, True
+    if out_of_time():
+        return 0, 0, False
+
+    # resume after the last checkpointed line, which always ends with a newline
+    resume_from = int(checkpoint.get("offset", start))
+    line_number = int(checkpoint.get("line", 0))
+    if checkpoint:
+        logger.info(f"Resuming bytes {start}-{end} of {key} from byte {resume_from}")
+
+    read_from = max(0, resume_from - 1)
+    s3_object = s3(POOL_CONNECTIONS).get_object(
+        Bucket=bucket, Key=key, IfMatch=etag, Range=f"bytes={read_from}-"
+    )
+    s3_body = s3_object["Body"]
+    lines = iter_lines(s3_body.iter_chunks(READ_CHUNK_SIZE), read_from)
+
+    table = dynamodb().Table(REPORTS_TABLE_NAME)
+
+    entries_count, lines_count, finished = 0, 0, False
+    try:
+        while not finished:
+            reports = []
+            # the batch writer is flushed before the checkpoint is saved
+            with table.batch_writer(overwrite_by_pkeys=["ID"]) as batch:
+                for offset, line in lines:
+                    if offset < resume_from:
+                        continue
+                    if offset >= end:
+                        finished = True
+                        break
+                    resume_from = offset + len(line) + 1
+                    line_number += 1
+                    lines_count += 1
+                    if line.strip():
+                        report = parse_report(line)
+                        report["version"] = load_version()
+                        batch.put_item(Item=report)
+                        reports.append(report)
+                        entries_count += 1
+                    if lines_count % CHECKPOINT_LINES == 0:
+                        break
+                else:
+                    finished = True
+
+            if BACKFILL_INDEX and reports:
+                index_reports(reports)
+            save_checkpoint(
+                bucket, key, etag, start, end, resume_from, line_number, finished
+            )
+            if not finished and out_of_time():
+                logger.info(
+                    f"Checkpointed {key} at byte {resume_from}, line {line_number}"
+                )
+                break
+    finally:
+        s3_body.close()
+
+    logger.info(f"Processed {entries_count} entries from bytes {start}-{end} of {key}")
+    return entries_count, lines_count, finished
+
+
+def record_key(record):
+    return urllib.parse.unquote_plus(record["s3"]["object"]["key"], encoding="utf-8")
+
+
+def load_files(records, out_of_time, started):
+    files = {}
+    futures = {}
+    for record in records:
+        # Get the S3 bucket and object key from the event
+        bucket = record["s3"]["bucket"]["name"]
+        key = record_key(record)
+
+        head = s3(POOL_CONNECTIONS).head_object(Bucket=bucket, Key=key)
+        size = head["ContentLength"]
+        logger.info(f"Processing file {key} ({size} bytes) ...")
+
+        # split the file into byte ranges that are parsed in parallel
+        files[key] = {
+            "bucket": bucket,
+            "bytes": size,
+            "entries": 0,
+            "lines": 0,
+            "starts": [],
+            "unfinished": 0,
+            "seconds": 0,
+        }
+        for start in range(0, size, RANGE_SIZE):
+            end = min(start + RANGE_SIZE, size)
+            future = executor.submit(
+                load_range, bucket, key, head["ETag"], start, end, out_of_time
             )
-            batch.put_item(Item=report)
-            entries_count += 1
+            futures[future] = key
+            files[key]["starts"].append(start)
 
-    print(f"Successfully processed {entries_count} records from {key}")
+    for future in as_completed(futures):
+        stats = files[futures[future]]
+        entries_count, lines_count, finished = future.result()
+        stats["entries"] += entries_count
+        stats["lines"] += lines_count
+        stats["unfinished"] += 0 if finished else 1
+        stats["seconds"] = time.perf_counter() - started
+
+    return files
+
+
+@with_metrics
+def lambda_handler(event, context):
+    log_event(event, context)
+
+    def out_of_time():
+        return context.get_remaining_time_in_millis() < TIMEOUT_MARGIN_MS
+
+    started = time.perf_counter()
+    pause_refresh = BACKFILL_INDEX and BACKFILL_DISABLE_REFRESH
+    if pause_refresh:
+        refresh_interval = disable_refresh()
+    try:
+        files = load_files(event["Records"], out_of_time, started)
+    finally:
+        if pause_refresh:
+            restore_refresh(refresh_interval)
+
+    total_seconds = time.perf_counter() - started
+    total_entries = sum(stats["entries"] for stats in files.values())
+    total_bytes = sum(stats["bytes"] for stats in files.values())
+
+    for key, stats in files.items():
+        logger.info(
+            f"Successfully processed {stats['entries']} records from {key} "
+            f"in {len(stats['starts'])} ranges, {stats['unfinished']} unfinished: "
+            f"{throughput(stats['entries'], stats['bytes'], stats['seconds'])}"
+        )
+    logger.info(
+        f"Successfully processed {total_entries} records from {len(files)} files: "
+        f"{throughput(total_entries, total_bytes, total_seconds)}"
+    )
+
+    # files finished by this and earlier invocations of the chain, whose checkpoints
+    # are kept until every file of the original event is done
+    completed = event.get("completedFiles", []) + [
+        {"bucket": stats["bucket"], "key": key, "starts": stats["starts"]}
+        for key, stats in files.items()
+        if not stats["unfinished"]
+    ]
+
+    # continue from the checkpoints in a new invocation, unless nothing progressed;
+    # only the unfinished files are passed on so finished ones are not reloaded
+    unfinished = any(stats["unfinished"] for stats in files.values())
+    if unfinished and any(stats["lines"] for stats in files.values()):
+        logger.info("Running out of time, invoking continuation ...")
+        records = [
+            record
+            for record in event["Records"]
+            if files[record_key(record)]["unfinished"]
+        ]
+        response = client("lambda").invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps(
+                {**event, "Records": records, "completedFiles": completed}
+            ),
+        )
+        logger.debug("Response: %s", response)
+    elif unfinished:
+        raise Exception("Failed to make progress before running out of time")
+    else:
+        for file in completed:
+            delete_checkpoints(file["bucket"], file["key"], file["starts"])
 
     return {
         "statusCode": 200,
         "body": json.dumps(
-            f"Successfully processed {entries_count} records from {key}"
+            f"Successfully processed {total_entries} records from {len(files)} files"
         ),
     }
+
+
+def throughput(entries_count, size, seconds):
+    seconds = max(seconds, 1e-6)
+    return (
+        f"{seconds:.2f}s, {entries_count / seconds:.0f} records/s, "
+        f"{size / seconds / (1024 * 1024):.2f} MB/s"
+    )
@@ -11,6 +11,14 @@ MASTER_USERNAME = os.environ["MASTER_USERNAME"]
 MASTER_PASSWORD = os.environ["MASTER_PASSWORD"]
 ALL_ACCESS_ROLES = list(filter(None, os.environ.get("ALL_ACCESS_ROLES", []).split(",")))
 
+# must match the dimension of the vectors built by the helper layer vectorizer
+VECTOR_DIMENSION = 256
+VECTOR_MAPPING = {
+    "type": "knn_vector",
+    "dimension": VECTOR_DIMENSION,
+    "method": {"name": "hnsw", "engine": "lucene", "space_type": "cosinesimil"},
+}
+
 CREATE = "Create"
 UPDATE = "Update"
 
@@ -36,6 +44,9 @@ def lambda_handler(event, context):
             create_groups_index()
             print(f"Assigning {ALL_ACCESS_ROLES} to all_access role ...")
             assign_all_access_roles(ALL_ACCESS_ROLES)
+            # runs last, so the rest of the configuration never depends on it
+            print("Adding vector mapping to reports index ...")
+            add_vector_mapping()
         print("Successfully completed all domain configurations")
         cfnresponse.send(event, context, cfnresponse.SUCCESS, response_data)
 
@@ -51,6 +62,7 @@ def create_reports_index():
         response = search.indices.create(
             "reports",
             body={
+                "settings": {"index": {"knn": True}},
                 "mappings": {
                     "properties": {
                         "reportID": {"type": "keyword"},
@@ -59,13 +71,32 @@ def create_reports_index():
                         "building": {"type": "keyword"},
                         "status": {"type": "keyword"},
                         "createdDate": {"type": "date"},
+                        "vector": VECTOR_MAPPING,
                     }
-                }
+                },
             },
         )
         print(f"Successfully created reports index: {response}")
 
 
+def add_vector_mapping():
+    # new fields can be added to an existing index, but an index created without
+    # the knn setting has to be reindexed before it accepts vectors, so the mapping
+    # is skipped and INDEX_VECTORS has to stay off until then
+    settings = search.indices.get_settings(index="reports", name="index.knn")
+    knn = settings["reports"]["settings"].get("index", {}).get("knn", "false")
+    if str(knn).lower() != "true":
+        print(
+            "Skipped vector mapping: reports index was created without index.knn "
+            "and has to be reindexed into a new index before vectors can be enabled"
+        )
+        return
+    response = search.indices.put_mapping(
+        index="reports", body={"properties": {"vector": VECTOR_MAPPING}}
+    )
+    print(f"Successfully added vector mapping to reports index: {response}")
+
+
 def create_groups_index():
     if search.indices.exists("groups"):
         print(f"groups index already exists")
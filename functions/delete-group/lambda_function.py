@@ -1,6 +1,8 @@
 import os
 import json
-import boto3
+from clients import dynamodb, sqs
+from logs import log_event, logger
+from metrics import with_metrics
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
 PROCESS_REPORT_QUEUE_URL = os.environ["PROCESS_REPORT_QUEUE_URL"]
@@ -18,12 +20,10 @@ CORS_HEADERS = {
     "Access-Control-Allow-Methods": "GET,PATCH,DELETE,OPTIONS",
 }
 
-sqs = boto3.client("sqs")
-dynamodb = boto3.resource("dynamodb")
-
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         group_id = event["pathParameters"]["groupId"]
@@ -32,7 +32,7 @@ def lambda_handler(event, context):
         if params := event.get("queryStringParameters"):
             cascade = params.get("cascade", "false").lower() == "true"
 
-        reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+        reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
         items = reports_table.query(
             IndexName=GROUP_INDEX_NAME,
             KeyConditionExpression="groupID = :groupID",
@@ -61,7 +61,7 @@ def lambda_handler(event, context):
         }
 
     except Exception as error:
-        print(f"Error: {error}")
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
@@ -74,12 +74,12 @@ def send_delete_group_message(group_id):
         "operation": DELETE_GROUP_OPERATION,
         "group": {"groupID": group_id},
     }
-    print(f"Sending message to process-group-queue: {message}")
-    response = sqs.send_message(
+    logger.debug("Sending message to process-group-queue: %s", message)
+    response = sqs().send_message(
         QueueUrl=PROCESS_GROUP_QUEUE_URL,
         MessageBody=json.dumps(message),
     )
-    print(response)
+    logger.debug("Response: %s", response)
 
 
 def send_delete_reports_message(report_ids):
@@ -87,12 +87,12 @@ def send_delete_reports_message(report_ids):
         "operation": DELETE_REPORT_OPERATION,
         "reports": [{"reportID": report_id} for report_id in report_ids],
     }
-    print(f"Sending message to process-report-queue: {message}")
-    response = sqs.send_message(
+    logger.debug("Sending message to process-report-queue: %s", message)
+    response = sqs().send_message(
         QueueUrl=PROCESS_REPORT_QUEUE_URL,
         MessageBody=json.dumps(message),
     )
-    print(response)
+    logger.debug("Response: %s", response)
 
 
 def send_ungroup_reports_message(report_ids):
@@ -100,9 +100,9 @@ def send_ungroup_reports_message(report_ids):
         "operation": UNGROUP_REPORT_OPERATION,
         "reports": [{"reportID": report_id} for report_id in report_ids],
     }
-    print(f"Sending message to process-report-queue: {message}")
-    response = sqs.send_message(
+    logger.debug("Sending message to process-report-queue: %s", message)
+    response = sqs().send_message(
         QueueUrl=PROCESS_REPORT_QUEUE_URL,
         MessageBody=json.dumps(message),
     )
-    print(response)
+    logger.debug("Response: %s", response)
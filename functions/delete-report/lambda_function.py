@@ -1,7 +1,9 @@
 import os
 import json
-import boto3
 from apigateway_helper import cors_headers, AuthContext
+from clients import dynamodb, sqs
+from logs import log_event, logger
+from metrics import with_metrics
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
 PROCESS_REPORT_QUEUE_URL = os.environ["PROCESS_REPORT_QUEUE_URL"]
@@ -11,23 +13,19 @@ ADMIN_POOL_ID = os.environ["ADMIN_POOL_ID"]
 DELETE_REPORT_OPERATION = "DELETE_REPORT"
 
 
-s3 = boto3.client("s3")
-sqs = boto3.client("sqs")
-dynamodb = boto3.resource("dynamodb")
-
-
 def allow_methods(auth_context):
     return "GET,DELETE,OPTIONS"
 
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         auth_context = AuthContext(event, ADMIN_POOL_ID, USER_POOL_ID)
         report_id = event["pathParameters"]["reportId"]
 
-        reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+        reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
         user_id = (
             reports_table.get_item(Key={"ID": report_id}).get("Item", {}).get("userID")
         )
@@ -42,12 +40,12 @@ def lambda_handler(event, context):
                 "operation": DELETE_REPORT_OPERATION,
                 "reports": [{"reportID": report_id}],
             }
-            print(f"Sending message to process-report-queue: {message}")
-            response = sqs.send_message(
+            logger.debug("Sending message to process-report-queue: %s", message)
+            response = sqs().send_message(
                 QueueUrl=PROCESS_REPORT_QUEUE_URL,
                 MessageBody=json.dumps(message),
             )
-            print(response)
+            logger.debug("Response: %s", response)
             return {
                 "statusCode": 200,
                 "headers": cors_headers(allow_methods(auth_context)),
@@ -61,7 +59,7 @@ def lambda_handler(event, context):
             }
 
     except Exception as error:
-        print(f"Error: {error}")
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": cors_headers("OPTIONS"),
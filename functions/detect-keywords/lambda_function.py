@@ -1,54 +1,121 @@
 import os
 import json
-import boto3
-import inflect
+from concurrent.futures import ThreadPoolExecutor
+from clients import comprehend, dynamodb
+from logs import log_event, logger
+from metrics import with_metrics
+from normalizers import normalize_words
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", 10))
+COMPREHEND_BATCH_SIZE = 25
 
-comprehend = boto3.client("comprehend")
-dynamodb = boto3.resource("dynamodb")
 
-p = inflect.engine()
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
 
 
-def detect_keywords(description):
-    response = comprehend.detect_key_phrases(Text=description, LanguageCode="en")
+def phrase_keywords(key_phrases):
+    return [kw for kp in key_phrases for kw in normalize_words(kp["Text"])]
 
-    def normalize(word):
-        word = word.lower().strip()
-        return singular if (singular := p.singular_noun(word)) else word
 
-    return [
-        normalize(kw) for kp in response["KeyPhrases"] for kw in kp["Text"].split(" ")
-    ]
+def detect_item_keywords(description):
+    try:
+        response = comprehend().detect_key_phrases(Text=description, LanguageCode="en")
+    except Exception as error:
+        logger.error(f"Failed to detect key phrases: {error}")
+        return None
+    return phrase_keywords(response["KeyPhrases"])
+
+
+def detect_keywords(descriptions):
+    # keywords for each description, or None if it could not be processed; blank
+    # descriptions have no keywords and are not sent, since comprehend rejects the
+    # whole batch for a single empty text
+    keywords = [None if description.strip() else [] for description in descriptions]
+    indexes = [i for i, kws in enumerate(keywords) if kws is None]
+    for i in range(0, len(indexes), COMPREHEND_BATCH_SIZE):
+        chunk = indexes[i : i + COMPREHEND_BATCH_SIZE]
+        try:
+            response = comprehend().batch_detect_key_phrases(
+                TextList=[descriptions[index] for index in chunk],
+                LanguageCode="en",
+            )
+        except Exception as error:
+            # the descriptions of a failed batch are retried one at a time, so only
+            # those that cause the error are failed
+            logger.error(f"Failed to detect key phrases of a batch: {error}")
+            for index in chunk:
+                keywords[index] = detect_item_keywords(descriptions[index])
+            continue
+
+        # results refer to descriptions by their index within the request
+        for result in response["ResultList"]:
+            keywords[chunk[result["Index"]]] = phrase_keywords(result["KeyPhrases"])
+        for error in response["ErrorList"]:
+            logger.error(f"Failed to detect key phrases: {error}")
+    return keywords
 
 
 def update_report(reportID, keywords):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
 
     # Update the record in DynamoDB with the new keywords
     return reports_table.update_item(
         Key={"ID": reportID},
-        UpdateExpression="SET keywords = :keywords",
-        ExpressionAttributeValues={":keywords": set(keywords)},
+        UpdateExpression="SET keywords = :keywords ADD version :one",
+        ExpressionAttributeValues={":keywords": set(keywords), ":one": 1},
     )
 
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
-
-    message_body = json.loads(event["Records"][0]["body"])
-    reportID = message_body["reportID"]
-    description = message_body["description"]
-
-    try:
-        keywords = detect_keywords(description)
-        print(f"Detected keywords: {keywords}")
-
-        response = update_report(reportID, keywords)
-        print(f"Successfully updated report: {response}")
-
-    except Exception as error:
-        print(error)
+    log_event(event, context)
+
+    messages, failed_message_ids = [], []
+    for record in event["Records"]:
+        try:
+            message_body = json.loads(record["body"])
+            messages.append(
+                (
+                    record["messageId"],
+                    message_body["reportID"],
+                    message_body["description"],
+                )
+            )
+        except Exception as error:
+            logger.error(f"Failed to parse message {record['messageId']}: {error}")
+            failed_message_ids.append(record["messageId"])
+
+    detected_keywords = detect_keywords([description for _, _, description in messages])
+
+    futures = {}
+    for (message_id, reportID, _), keywords in zip(messages, detected_keywords):
+        if keywords is None:
+            failed_message_ids.append(message_id)
+        elif not keywords:
+            logger.info(f"No keywords detected for report {reportID}")
+        else:
+            logger.info(f"Detected keywords for report {reportID}: {keywords}")
+            futures[message_id] = executor.submit(update_report, reportID, keywords)
+
+    updated_count = 0
+    for message_id, future in futures.items():
+        try:
+            response = future.result()
+            logger.debug("Successfully updated report: %s", response)
+            updated_count += 1
+        except Exception as error:
+            logger.error(f"Failed to update report for message {message_id}: {error}")
+            failed_message_ids.append(message_id)
+
+    logger.info(
+        f"Successfully extracted keywords for {updated_count} reports, "
+        f"{len(failed_message_ids)} messages failed"
+    )
 
-    return {"statusCode": 200, "body": json.dumps("Successfully extracted keywords")}
+    # only the failed messages are returned to the queue
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in failed_message_ids
+        ]
+    }
@@ -1,44 +1,37 @@
 import os
 import json
-import boto3
 import urllib.parse
-import inflect
+from clients import dynamodb, rekognition
+from logs import log_event, logger
+from metrics import with_metrics
+from normalizers import normalize_words
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
 
-dynamodb = boto3.resource("dynamodb")
-rekognition = boto3.client("rekognition")
-s3 = boto3.client("s3")
-
-p = inflect.engine()
-
 
 def detect_photo_labels(bucket_name, object_key):
-    response = rekognition.detect_labels(
+    response = rekognition().detect_labels(
         Image={"S3Object": {"Bucket": bucket_name, "Name": object_key}},
         MaxLabels=5,
     )
 
-    def normalize(word):
-        word = word.lower().strip()
-        return singular if (singular := p.singular_noun(word)) else word
-
-    return [normalize(lw) for l in response["Labels"] for lw in l["Name"].split(" ")]
+    return [lw for l in response["Labels"] for lw in normalize_words(l["Name"])]
 
 
 def update_report(reportID, photo_labels):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
 
     # Update the record in DynamoDB with the new photo labels
     return reports_table.update_item(
         Key={"ID": reportID},
-        UpdateExpression="ADD photoLabels :photoLabels",
-        ExpressionAttributeValues={":photoLabels": set(photo_labels)},
+        UpdateExpression="ADD photoLabels :photoLabels, version :one",
+        ExpressionAttributeValues={":photoLabels": set(photo_labels), ":one": 1},
     )
 
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     bucket_name = event["Records"][0]["s3"]["bucket"]["name"]
     object_key = urllib.parse.unquote_plus(
@@ -48,17 +41,17 @@ def lambda_handler(event, context):
     # key_name should be in form {reportID}/{image_name}
     reportID = object_key.split("/")[0]
     image_name = object_key.split("/")[1]
-    print(f"Processing image {image_name} for report {reportID}")
+    logger.info(f"Processing image {image_name} for report {reportID}")
 
     try:
         photo_labels = detect_photo_labels(bucket_name, object_key)
-        print(f"Detected photo labels: {photo_labels}")
+        logger.info(f"Detected photo labels: {photo_labels}")
 
         response = update_report(reportID, photo_labels)
-        print(f"Successfully updated report: {response}")
+        logger.debug("Successfully updated report: %s", response)
 
     except Exception as error:
-        print(error)
+        logger.error(f"Error: {error}")
 
     return {
         "statusCode": 200,
@@ -1,77 +1,151 @@
 import os
 import json
-import boto3
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, wait
+from apigateway_helper import CACHE_CONTROL, entity_tag, etag_matches, item_version
+from clients import dynamodb
 from formatters import format_group, format_group_report, DataSource
+from logs import log_event, logger
+from metrics import timed, with_metrics
+from pagination import decode_cursor, encode_cursor
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
 GROUP_INDEX_NAME = os.environ["GROUP_INDEX_NAME"]
 
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 100
+
 CORS_HEADERS = {
-    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Allow-Headers": "Content-Type,If-None-Match",
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "GET,PATCH,DELETE,OPTIONS",
 }
 
-dynamodb = boto3.resource("dynamodb")
+executor = ThreadPoolExecutor(max_workers=2)
 
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         groupID = event["pathParameters"]["groupId"]
-        print(f"Retrieving group {groupID} ...")
-
-        group, reports = get_group_by_id(groupID)
-        if group:
-            return {
-                "statusCode": 200,
-                "headers": CORS_HEADERS,
-                "body": json.dumps(
+        params = p if (p := event.get("queryStringParameters")) else {}
+        logger.info(f"Retrieving group {groupID} with query params {params} ...")
+
+        limit, cursor = params.get("limit"), params.get("cursor")
+        group_item, report_items, next_cursor = get_group_by_id(
+            groupID, limit=limit, cursor=cursor
+        )
+        if group_item:
+            # the page changes with the group or any of its listed reports
+            etag = entity_tag(
+                item_version(group_item),
+                [(item["ID"], item_version(item)) for item in report_items],
+                limit,
+                cursor,
+                next_cursor,
+            )
+            headers = {**CORS_HEADERS, "ETag": etag, "Cache-Control": CACHE_CONTROL}
+            if etag_matches(event, etag):
+                logger.info(f"Group {groupID} not modified")
+                return {"statusCode": 304, "headers": headers}
+
+            with timed("serialize"):
+                group = format_group(group_item, DataSource.DYNAMODB)
+                reports = [
+                    format_group_report(item, DataSource.DYNAMODB)
+                    for item in report_items
+                ]
+                body = json.dumps(
                     {
                         "group": group,
                         "reports": reports,
+                        "cursor": next_cursor,
                     }
-                ),
-            }
+                )
+            return {"statusCode": 200, "headers": headers, "body": body}
         return {
             "statusCode": 404,
             "headers": CORS_HEADERS,
             "body": json.dumps(f"Group {groupID} not found"),
         }
 
+    except ValueError as error:
+        logger.error(f"Error: {error}")
+        return {
+            "statusCode": 400,
+            "headers": CORS_HEADERS,
+            "body": json.dumps("Invalid query parameters"),
+        }
+
     except Exception as error:
-        print(f"Error: {error}")
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
-            "body": json.dumps(f"Internal server error"),
+            "body": json.dumps("Internal server error"),
         }
 
 
-def get_group_by_id(groupID):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
-    response = reports_table.get_item(Key={"ID": groupID})
+def get_group(groupID):
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
+    return reports_table.get_item(Key={"ID": groupID})
 
-    if item := response.get("Item"):
-        group = format_group(item, DataSource.DYNAMODB)
-        print(f"Successfully retrieved group: {group}")
 
-        response = reports_table.query(
-            IndexName=GROUP_INDEX_NAME,
-            KeyConditionExpression="groupID = :groupID",
-            ExpressionAttributeValues={
-                ":groupID": groupID,
-            },
+def get_group_reports(groupID, limit, start_key):
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
+    # only the attributes format_group_report and the etag read, and only the
+    # reports, since the group item itself is also in the index
+    params = {
+        "IndexName": GROUP_INDEX_NAME,
+        "KeyConditionExpression": "groupID = :groupID",
+        "FilterExpression": "begins_with(ID, :prefix)",
+        "ProjectionExpression": "ID, title, createdDate, #status, version",
+        "ExpressionAttributeNames": {"#status": "status"},
+        "ExpressionAttributeValues": {":groupID": groupID, ":prefix": "RPT-"},
+    }
+    # the limit applies before the filter drops the group item, so the index is
+    # queried again for the reports still missing from the page; a page is only
+    # short or empty when it is the last one
+    items = []
+    while True:
+        params["Limit"] = limit - len(items)
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        response = reports_table.query(**params)
+        items.extend(response.get("Items", []))
+        start_key = response.get("LastEvaluatedKey")
+        if len(items) >= limit or not start_key:
+            break
+    return {"Items": items, "LastEvaluatedKey": start_key}
+
+
+def get_group_by_id(groupID, limit=None, cursor=None):
+    limit = DEFAULT_LIMIT if limit is None else min(MAX_LIMIT, max(1, int(limit)))
+    start_key = decode_cursor(cursor) if cursor else None
+
+    # the group and the first page of its reports are read at the same time
+    group_future = executor.submit(get_group, groupID)
+    reports_future = executor.submit(get_group_reports, groupID, limit, start_key)
+
+    response = group_future.result()
+    if group_item := response.get("Item"):
+        logger.debug("Successfully retrieved group: %s", group_item)
+
+        response = reports_future.result()
+        report_items = response.get("Items", [])
+        next_cursor = (
+            encode_cursor(key) if (key := response.get("LastEvaluatedKey")) else None
+        )
+        logger.info(
+            f"Successfully retrieved {len(report_items)} reports of group {groupID}"
         )
-        reports = [
-            format_group_report(item, DataSource.DYNAMODB)
-            for item in response.get("Items", [])
-            if item["ID"].startswith("RPT-")
-        ]
-        print(f"Successfully retrieved reports: {group}")
-        return group, reports
-
-    print(f"Failed to retrieve report {groupID}: {response}")
-    return None, None
+        return group_item, report_items, next_cursor
+
+    # the reports query is not left running into the next invocation, where its
+    # calls would be counted in the wrong metrics
+    if not reports_future.cancel():
+        wait([reports_future])
+    logger.info(f"Failed to retrieve group {groupID}")
+    return None, None, None
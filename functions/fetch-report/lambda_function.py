@@ -1,9 +1,19 @@
 import os
 import json
-import boto3
 from botocore.exceptions import ClientError
-from apigateway_helper import cors_headers, AuthContext
+from apigateway_helper import (
+    CACHE_CONTROL,
+    cors_headers,
+    entity_tag,
+    etag_matches,
+    item_version,
+    AuthContext,
+)
+from clients import dynamodb, s3
 from formatters import format_report, DataSource
+from logs import log_event, logger
+from metrics import timed, with_metrics
+from presigned import PRESIGN_EXPIRATION, presign_window, presigned_url
 
 PHOTOS_BUCKET_NAME = os.environ["PHOTOS_BUCKET_NAME"]
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
@@ -15,30 +25,46 @@ def allow_methods(auth_context):
     return "GET,DELETE,OPTIONS"
 
 
-s3 = boto3.client("s3")
-dynamodb = boto3.resource("dynamodb")
-
-
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         auth_context = AuthContext(event, ADMIN_POOL_ID, USER_POOL_ID)
 
         reportID = event["pathParameters"]["reportId"]
-        print(f"Retrieving report {reportID} ...")
-        report, image_urls = get_report_by_id(reportID, auth_context)
-        if report:
-            return {
-                "statusCode": 200,
-                "headers": cors_headers(allow_methods(auth_context)),
-                "body": json.dumps(
+        logger.info(f"Retrieving report {reportID} ...")
+        item = get_report_by_id(reportID, auth_context)
+        if item:
+            # the image urls are part of the response, so the tag changes with the
+            # window they are presigned in
+            etag = entity_tag(
+                item["ID"],
+                item_version(item),
+                auth_context.is_admin,
+                presign_window(PRESIGN_EXPIRATION),
+            )
+            headers = {
+                **cors_headers(
+                    allow_methods(auth_context),
+                    allow_headers="Content-Type,If-None-Match",
+                ),
+                "ETag": etag,
+                "Cache-Control": CACHE_CONTROL,
+            }
+            if etag_matches(event, etag):
+                logger.info(f"Report {reportID} not modified")
+                return {"statusCode": 304, "headers": headers}
+
+            report, image_urls = format_report_with_images(item, auth_context)
+            with timed("serialize"):
+                body = json.dumps(
                     {
                         "report": report,
                         "images": image_urls,
                     }
-                ),
-            }
+                )
+            return {"statusCode": 200, "headers": headers, "body": body}
         return {
             "statusCode": 404,
             "headers": cors_headers(allow_methods(auth_context)),
@@ -46,7 +72,7 @@ def lambda_handler(event, context):
         }
 
     except Exception as error:
-        print(f"Error: {error}")
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": cors_headers("OPTIONS"),
@@ -55,29 +81,32 @@ def lambda_handler(event, context):
 
 
 def get_report_by_id(reportID, auth_context):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
     response = reports_table.get_item(Key={"ID": reportID})
 
     if item := response.get("Item"):
         if auth_context.is_admin or auth_context.user_id == item["userID"]:
-            report = format_report(item, DataSource.DYNAMODB, auth_context.is_admin)
-            print(f"Successfully retrieved report: {report}")
+            logger.info(f"Successfully retrieved report {reportID}")
+            return item
+
+    logger.info(f"Failed to retrieve report {reportID}")
+    return None
 
-            image_urls = [
-                generate_presigned_url(PHOTOS_BUCKET_NAME, key)
-                for key in item.get("imageKeys", [])
-            ]
-            print(f"Successfully retrieved presigned image URLs: {image_urls}")
-            return report, image_urls
 
-    print(f"Failed to retrieve report {reportID}: {response}")
-    return None, None
+def format_report_with_images(item, auth_context):
+    with timed("presign"):
+        image_urls = [
+            generate_presigned_url(PHOTOS_BUCKET_NAME, key)
+            for key in item.get("imageKeys", [])
+        ]
+    logger.debug("Successfully retrieved presigned image URLs: %s", image_urls)
+    report = format_report(item, DataSource.DYNAMODB, auth_context.is_admin)
+    logger.debug("Successfully retrieved report: %s", report)
+    return report, image_urls
 
 
-def generate_presigned_url(bucket, key, expiration=3600):
+def generate_presigned_url(bucket, key, expiration=PRESIGN_EXPIRATION):
     try:
-        return s3.generate_presigned_url(
-            "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expiration
-        )
+        return presigned_url(s3(), bucket, key, expiration)
     except ClientError as error:
-        print(f"Error generating presigned URL for object {key}: {error}")
+        logger.error(f"Error generating presigned URL for object {key}: {error}")
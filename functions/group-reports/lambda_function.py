@@ -1,6 +1,8 @@
 import os
 import json
-import boto3
+from clients import dynamodb, sqs
+from logs import log_event, logger
+from metrics import with_metrics
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
 PROCESS_REPORT_QUEUE_URL = os.environ["PROCESS_REPORT_QUEUE_URL"]
@@ -13,12 +15,10 @@ CORS_HEADERS = {
 
 GROUP_REPORT_OPERATION = "GROUP_REPORT"
 
-sqs = boto3.client("sqs")
-dynamodb = boto3.resource("dynamodb")
-
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         body = json.loads(event["body"])
@@ -31,7 +31,7 @@ def lambda_handler(event, context):
                 "body": json.dumps("No reports were provided"),
             }
 
-        reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+        reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
         response = reports_table.get_item(Key={"ID": group_id})
         if not response.get("Item"):
             return {
@@ -50,12 +50,12 @@ def lambda_handler(event, context):
                 for report_id in body["reports"]
             ],
         }
-        print(f"Sending message to process-report-queue: {message}")
-        response = sqs.send_message(
+        logger.debug("Sending message to process-report-queue: %s", message)
+        response = sqs().send_message(
             QueueUrl=PROCESS_REPORT_QUEUE_URL,
             MessageBody=json.dumps(message),
         )
-        print(response)
+        logger.debug("Response: %s", response)
 
         return {
             "statusCode": 200,
@@ -64,7 +64,7 @@ def lambda_handler(event, context):
         }
 
     except Exception as error:
-        print(error)
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
@@ -1,8 +1,10 @@
 import os
 import json
-import boto3
 from uuid import uuid1
 from botocore.exceptions import ClientError
+from clients import sqs
+from logs import log_event, logger
+from metrics import with_metrics
 
 PROCESS_GROUP_QUEUE_URL = os.environ["PROCESS_GROUP_QUEUE_URL"]
 PROCESS_REPORT_QUEUE_URL = os.environ["PROCESS_REPORT_QUEUE_URL"]
@@ -16,11 +18,10 @@ CORS_HEADERS = {
 CREATE_GROUP_OPERATION = "CREATE_GROUP"
 GROUP_REPORT_OPERATION = "GROUP_REPORT"
 
-sqs = boto3.client("sqs")
-
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         body = json.loads(event["body"])
@@ -36,12 +37,12 @@ def lambda_handler(event, context):
             },
         }
 
-        print(f"Sending message to process-group-queue: {message}")
-        response = sqs.send_message(
+        logger.debug("Sending message to process-group-queue: %s", message)
+        response = sqs().send_message(
             QueueUrl=PROCESS_GROUP_QUEUE_URL,
             MessageBody=json.dumps(message),
         )
-        print(response)
+        logger.debug("Response: %s", response)
 
         message = {
             "operation": GROUP_REPORT_OPERATION,
@@ -53,12 +54,12 @@ def lambda_handler(event, context):
                 for report_id in body["reports"]
             ],
         }
-        print(f"Sending message to process-report-queue: {message}")
-        response = sqs.send_message(
+        logger.debug("Sending message to process-report-queue: %s", message)
+        response = sqs().send_message(
             QueueUrl=PROCESS_REPORT_QUEUE_URL,
             MessageBody=json.dumps(message),
         )
-        print(response)
+        logger.debug("Response: %s", response)
 
         return {
             "statusCode": 200,
@@ -67,7 +68,7 @@ def lambda_handler(event, context):
         }
 
     except ClientError as error:
-        print(error)
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
@@ -1,9 +1,12 @@
 import os
 import json
-import boto3
 from uuid import uuid1
 from datetime import datetime
 from botocore.exceptions import ClientError
+from clients import s3, sqs
+from logs import log_event, logger
+from metrics import with_metrics
+from presigned import PRESIGN_EXPIRATION, presigned_post
 
 PHOTOS_BUCKET_NAME = os.environ["PHOTOS_BUCKET_NAME"]
 PROCESS_REPORT_QUEUE_URL = os.environ["PROCESS_REPORT_QUEUE_URL"]
@@ -16,21 +19,18 @@ CORS_HEADERS = {
 
 CREATE_REPORT_OPERATION = "CREATE_REPORT"
 
-s3 = boto3.client("s3")
-sqs = boto3.client("sqs")
 
-
-def generate_presigned_post(bucket, report_id, images, expiration=3600):
+def generate_presigned_post(bucket, report_id, images, expiration=PRESIGN_EXPIRATION):
     image_keys = [f"{report_id}/{name}" for name in images]
     presigned_urls = [
-        s3.generate_presigned_post(Bucket=bucket, Key=key, ExpiresIn=expiration)
-        for key in image_keys
+        presigned_post(s3(), bucket, key, expiration) for key in image_keys
     ]
     return image_keys, presigned_urls
 
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         body = json.loads(event["body"])
@@ -59,14 +59,14 @@ def lambda_handler(event, context):
                 }
             ],
         }
-        print(f"Sending message to process-report-queue: {message}")
+        logger.debug("Sending message to process-report-queue: %s", message)
 
         # send create report message to SQS queue
-        response = sqs.send_message(
+        response = sqs().send_message(
             QueueUrl=PROCESS_REPORT_QUEUE_URL,
             MessageBody=json.dumps(message),
         )
-        print(response)
+        logger.debug("Response: %s", response)
 
         return {
             "statusCode": 200,
@@ -75,7 +75,7 @@ def lambda_handler(event, context):
         }
 
     except ClientError as error:
-        print(error)
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
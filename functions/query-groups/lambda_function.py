@@ -1,37 +1,52 @@
-import os
 import json
+from clients import search
 from formatters import format_group, DataSource
-from opensearch import opensearch
-
-AWS_REGION = os.environ["AWS_REGION"]
-DOMAIN_ENDPOINT = os.environ["DOMAIN_ENDPOINT"]
-DOMAIN_PORT = os.environ.get("DOMAIN_PORT", 443)
+from logs import log_event, logger
+from metrics import with_metrics
+from pagination import search_page
+from queries import (
+    GROUP_SOURCE_FIELDS,
+    group_stats,
+    group_stats_body,
+    groups_query,
+    search_body,
+)
 
 DEFAULT_SIZE = 20
 MAX_SIZE = 25
 
+# groups without reports have no bucket in the stats aggregation
+EMPTY_STATS = {
+    "reportCount": 0,
+    "openCount": 0,
+    "resolvedCount": 0,
+    "latestCreatedDate": None,
+}
+
 CORS_HEADERS = {
     "Access-Control-Allow-Headers": "Content-Type",
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
 }
 
-search = opensearch(AWS_REGION, DOMAIN_ENDPOINT, DOMAIN_PORT)
-
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         params = p if (p := event.get("queryStringParameters")) else {}
-        print(f"Retrieving groups with query params {params} ...")
+        logger.info(f"Retrieving groups with query params {params} ...")
 
         results = get_filtered_groups(
             page_from=params.get("from"),
             page_size=params.get("size"),
+            cursor=params.get("cursor"),
+            pit=params.get("pit", "false").lower() == "true",
             query=params.get("q"),
             building=params.get("building"),
             status=params.get("status"),
+            include=list(filter(None, params.get("include", "").split(","))),
         )
 
         return {
@@ -40,54 +55,75 @@ def lambda_handler(event, context):
             "body": json.dumps(results),
         }
 
+    except ValueError as error:
+        logger.error(f"Error: {error}")
+        return {
+            "statusCode": 400,
+            "headers": CORS_HEADERS,
+            "body": json.dumps("Invalid query parameters"),
+        }
+
     except Exception as error:
-        print(f"Error: {error}")
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
-            "body": json.dumps(f"Internal server error"),
+            "body": json.dumps("Internal server error"),
         }
 
 
 def get_filtered_groups(
-    page_from=None, page_size=None, query=None, building=None, status=None
+    page_from=None,
+    page_size=None,
+    cursor=None,
+    pit=False,
+    query=None,
+    building=None,
+    status=None,
+    include=None,
 ):
+    include = include or []
+    if any(option != "stats" for option in include):
+        raise ValueError(f"Unknown include options: {include}")
+
     page_from = 0 if page_from is None else max(0, int(page_from))
     page_size = (
         DEFAULT_SIZE if page_size is None else min(MAX_SIZE, max(1, int(page_size)))
     )
 
-    must_clauses = []
-    if building:
-        must_clauses.append({"term": {"building": building}})
-    if status:
-        must_clauses.append({"term": {"status": status}})
-    if query:
-        must_clauses.append(
-            {
-                "query_string": {
-                    "query": query,
-                    "fields": [
-                        "title^4",
-                        "building^2",
-                        "description",
-                    ],
-                }
-            }
-        )
-
-    response = search.search(
-        index="groups",
-        body={
-            "from": page_from if page_from else 0,
-            "size": page_size if page_size else 20,
-            "query": {"bool": {"must": must_clauses}},
-        },
+    body = search_body(
+        groups_query(query=query, building=building, status=status),
+        page_size,
+        GROUP_SOURCE_FIELDS,
+    )
+    response, next_cursor = search_page(
+        search(),
+        "groups",
+        body,
+        tiebreak="groupID",
+        page_from=page_from,
+        cursor=cursor,
+        pit=pit,
     )
-    print(f"Successfully queried groups: {response}")
+    logger.debug("Successfully queried groups: %s", response)
     total = response["hits"]["total"]["value"]
     groups = [
         format_group(hit["_source"], DataSource.OPENSEARCH)
         for hit in response["hits"]["hits"]
     ]
-    return {"total": total, "groups": groups}
+    if "stats" in include and groups:
+        stats = get_group_stats([group["groupId"] for group in groups])
+        for group in groups:
+            group["stats"] = stats.get(group["groupId"], EMPTY_STATS)
+    return {"total": total, "groups": groups, "cursor": next_cursor}
+
+
+def get_group_stats(group_ids):
+    # one aggregation over the reports of the whole page, instead of a group
+    # lookup for every row
+    response = search().search(
+        index="reports", body=group_stats_body(group_ids), request_cache=True
+    )
+    stats = group_stats(response["aggregations"])
+    logger.info(f"Successfully aggregated stats for {len(stats)} groups")
+    return stats
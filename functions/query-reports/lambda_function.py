@@ -1,12 +1,20 @@
 import os
 import json
 from apigateway_helper import cors_headers, AuthContext
+from clients import async_search, search
 from formatters import format_report, DataSource
-from opensearch import opensearch
+from logs import log_event, logger
+from metrics import with_metrics
+from opensearch import run_searches
+from pagination import page_cursor, page_request, search_page
+from queries import (
+    REPORT_SOURCE_FIELDS,
+    facet_counts,
+    reports_facets,
+    reports_query,
+    search_body,
+)
 
-AWS_REGION = os.environ["AWS_REGION"]
-DOMAIN_ENDPOINT = os.environ["DOMAIN_ENDPOINT"]
-DOMAIN_PORT = os.environ.get("DOMAIN_PORT", 443)
 USER_POOL_ID = os.environ["USER_POOL_ID"]
 ADMIN_POOL_ID = os.environ["ADMIN_POOL_ID"]
 
@@ -20,32 +28,34 @@ def allow_methods(auth_context):
     return "GET,POST,OPTIONS"
 
 
-search = opensearch(AWS_REGION, DOMAIN_ENDPOINT, DOMAIN_PORT)
-
-
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         auth_context = AuthContext(event, ADMIN_POOL_ID, USER_POOL_ID)
 
         params = p if (p := event.get("queryStringParameters")) else {}
-        print(f"Retrieving reports with query params {params} ...")
+        logger.info(f"Retrieving reports with query params {params} ...")
 
-        user_id, only_ungrouped = None, False
+        user_id, only_ungrouped, facets = None, False, []
         if auth_context.is_admin:
             user_id = params.get("userId")
             only_ungrouped = params.get("ungrouped", "false").lower() == "true"
+            facets = list(filter(None, params.get("facets", "").split(",")))
 
         results = get_filtered_reports(
             auth_context,
             page_from=params.get("from"),
             page_size=params.get("size"),
+            cursor=params.get("cursor"),
+            pit=params.get("pit", "false").lower() == "true",
             query=params.get("q"),
             user_id=user_id,
             building=params.get("building"),
             status=params.get("status"),
             only_ungrouped=only_ungrouped,
+            facets=facets,
         )
 
         return {
@@ -54,12 +64,20 @@ def lambda_handler(event, context):
             "body": json.dumps(results),
         }
 
+    except ValueError as error:
+        logger.error(f"Error: {error}")
+        return {
+            "statusCode": 400,
+            "headers": cors_headers(allow_methods(auth_context)),
+            "body": json.dumps("Invalid query parameters"),
+        }
+
     except Exception as error:
-        print(f"Error: {error}")
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": cors_headers("OPTIONS"),
-            "body": json.dumps(f"Internal server error"),
+            "body": json.dumps("Internal server error"),
         }
 
 
@@ -67,63 +85,63 @@ def get_filtered_reports(
     auth_context,
     page_from=None,
     page_size=None,
+    cursor=None,
+    pit=False,
     query=None,
     user_id=None,
     building=None,
     status=None,
     only_ungrouped=False,
+    facets=None,
 ):
     page_from = 0 if page_from is None else max(0, int(page_from))
     page_size = (
         DEFAULT_SIZE if page_size is None else min(MAX_SIZE, max(1, int(page_size)))
     )
 
-    must_clauses = []
-    if not auth_context.is_admin:
-        must_clauses.append({"term": {"userID": auth_context.user_id}})
-    elif user_id:
-        must_clauses.append({"term": {"userID": user_id}})
-    if building:
-        must_clauses.append({"term": {"building": building}})
-    if status:
-        must_clauses.append({"term": {"status": status}})
-    if query:
-        must_clauses.append(
-            {
-                "query_string": {
-                    "query": query,
-                    "fields": [
-                        "title^4",
-                        "keywords^4",
-                        "photoLabels^2",
-                        "building^2",
-                        "description",
-                    ],
-                }
-            }
-        )
-
-    must_not_clauses = []
-    if only_ungrouped:
-        must_not_clauses.append({"exists": {"field": "groupID"}})
-
-    response = search.search(
-        index="reports",
-        body={
-            "from": page_from if page_from else 0,
-            "size": page_size if page_size else DEFAULT_SIZE,
-            "query": {
-                "bool": {
-                    "must": must_clauses,
-                    "must_not": must_not_clauses,
-                }
-            },
-        },
+    filtered_query = reports_query(
+        query=query,
+        user_id=user_id if auth_context.is_admin else auth_context.user_id,
+        building=building,
+        status=status,
+        only_ungrouped=only_ungrouped,
     )
-    print(f"Successfully queried reports: {response}")
+    body = search_body(filtered_query, page_size, REPORT_SOURCE_FIELDS)
+    if not facets:
+        response, next_cursor = search_page(
+            search(),
+            "reports",
+            body,
+            tiebreak="reportID",
+            page_from=page_from,
+            cursor=cursor,
+            pit=pit,
+        )
+    else:
+        # facet counts are the same for every page, so they are a separate size=0
+        # search the shard request cache can answer, sent next to the page of hits
+        facets_body = {
+            "size": 0,
+            "query": filtered_query,
+            "aggs": reports_facets(facets),
+        }
+        index, body = page_request(
+            search(), "reports", body, "reportID", page_from, cursor, pit
+        )
+        response, facets_response = run_searches(
+            async_search().search(index=index, body=body, request_cache=True),
+            async_search().search(
+                index="reports", body=facets_body, request_cache=True
+            ),
+        )
+        next_cursor = page_cursor(search(), response, body)
+    logger.debug("Successfully queried reports: %s", response)
     total = response["hits"]["total"]["value"]
     reports = [
         format_report(hit["_source"], DataSource.OPENSEARCH, auth_context.is_admin)
         for hit in response["hits"]["hits"]
     ]
-    return {"total": total, "reports": reports}
+    results = {"total": total, "reports": reports, "cursor": next_cursor}
+    if facets:
+        results["facets"] = facet_counts(facets_response["aggregations"])
+    return results
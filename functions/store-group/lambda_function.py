@@ -1,6 +1,8 @@
 import os
 import json
-import boto3
+from clients import dynamodb
+from logs import log_event, logger
+from metrics import with_metrics
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
 
@@ -10,11 +12,9 @@ CREATE_GROUP_OPERATION = "CREATE_GROUP"
 DELETE_GROUP_OPERATION = "DELETE_GROUP"
 UPDATE_GROUP_OPERATION = "UPDATE_GROUP"
 
-dynamodb = boto3.resource("dynamodb")
-
 
 def create_group(group):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
     response = reports_table.put_item(
         Item={
             "ID": group["groupID"],
@@ -23,42 +23,46 @@ def create_group(group):
             "building": group["building"],
             "description": group["description"],
             "status": SUBMITTED_STATUS,
+            "version": 1,
         }
     )
-    print(f"Successfully created group in reports table: {response}")
+    logger.debug("Successfully created group in reports table: %s", response)
 
 
 def delete_group(group):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
     group_id = group["groupID"]
-    print(f"Deleting group {group_id} from reports table ...")
+    logger.info(f"Deleting group {group_id} from reports table ...")
     response = reports_table.delete_item(Key={"ID": group_id})
     if response.get("Attributes"):
-        print(f"Successfully deleted group {group_id} from reports table")
+        logger.info(f"Successfully deleted group {group_id} from reports table")
     else:
-        print(f"Group {group_id} not found in reports table")
+        logger.info(f"Group {group_id} not found in reports table")
 
 
 def update_group(group):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
     group_id = group["groupID"]
-    print(f"Updating group {group_id} in reports table ...")
+    logger.info(f"Updating group {group_id} in reports table ...")
     response = reports_table.update_item(
         Key={"ID": group_id},
-        UpdateExpression="SET #status = :status",
+        UpdateExpression="SET #status = :status ADD version :one",
         ExpressionAttributeNames={"#status": "status"},
-        ExpressionAttributeValues={":status": group["status"]},
+        ExpressionAttributeValues={":status": group["status"], ":one": 1},
+    )
+    logger.debug(
+        "Successfully updated group %s in reports table: %s", group_id, response
     )
-    print(f"Successfully updated group {group_id} in reports table: {response}")
 
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         message = json.loads(event["Records"][0]["body"])
         group = message["group"]
-        print(f"Processing {group} ...")
+        logger.info(f"Processing {group} ...")
 
         if message["operation"] == CREATE_GROUP_OPERATION:
             create_group(group)
@@ -68,7 +72,7 @@ def lambda_handler(event, context):
             update_group(group)
 
     except Exception as error:
-        print(error)
+        logger.error(f"Error: {error}")
 
     return {
         "statusCode": 200,
@@ -1,10 +1,17 @@
 import os
 import json
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from clients import dynamodb, s3, sqs
+from logs import log_event, logger
+from metrics import with_metrics
 
 PHOTOS_BUCKET_NAME = os.environ["PHOTOS_BUCKET_NAME"]
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
 DETECT_KEYWORDS_QUEUE_URL = os.environ["DETECT_KEYWORDS_QUEUE_URL"]
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", 16))
+S3_DELETE_BATCH_SIZE = 1000
+BATCH_GET_SIZE = 100
 
 SUBMITTED_STATUS = "SUBMITTED"
 
@@ -14,16 +21,15 @@ UPDATE_REPORT_OPERATION = "UPDATE_REPORT"
 GROUP_REPORT_OPERATION = "GROUP_REPORT"
 UNGROUP_REPORT_OPERATION = "UNGROUP_REPORT"
 
-s3 = boto3.client("s3")
-sqs = boto3.client("sqs")
-dynamodb = boto3.resource("dynamodb")
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
 
 
 def create_report(report):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
     response = reports_table.update_item(
         Key={"ID": report["reportID"]},
-        UpdateExpression="SET userID = :userID, title = :title, building = :building, description = :description, createdDate = :createdDate, imageKeys = :imageKeys, #status = :status",
+        UpdateExpression="SET userID = :userID, title = :title, building = :building, description = :description, createdDate = :createdDate, imageKeys = :imageKeys, #status = :status ADD version :one",
         ExpressionAttributeNames={
             "#status": "status",
         },
@@ -35,10 +41,11 @@ def create_report(report):
             ":createdDate": report["createdDate"],
             ":imageKeys": report["imageKeys"],
             ":status": SUBMITTED_STATUS,
+            ":one": 1,
         },
     )
-    print(f"Successfully created report in reports table: {response}")
-    response = sqs.send_message(
+    logger.debug("Successfully created report in reports table: %s", response)
+    response = sqs().send_message(
         QueueUrl=DETECT_KEYWORDS_QUEUE_URL,
         MessageBody=json.dumps(
             {
@@ -47,94 +54,199 @@ def create_report(report):
             }
         ),
     )
-    print(f"Successfully sent report to detect keywords queue: {response}")
+    logger.debug("Successfully sent report to detect keywords queue: %s", response)
+
+
+def get_image_keys(reports):
+    # the photos of the reports are read before anything is deleted, so a message
+    # that fails part way still finds them when it is retried
+    keys = [{"ID": report_id} for report_id in {r["reportID"] for r in reports}]
+    image_keys = []
+    for i in range(0, len(keys), BATCH_GET_SIZE):
+        request = {
+            REPORTS_TABLE_NAME: {
+                "Keys": keys[i : i + BATCH_GET_SIZE],
+                "ProjectionExpression": "ID, imageKeys",
+                "ConsistentRead": True,
+            }
+        }
+        while request:
+            response = dynamodb().batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(REPORTS_TABLE_NAME, []):
+                image_keys.extend(item.get("imageKeys", []))
+            request = response.get("UnprocessedKeys")
+    return image_keys
 
 
 def delete_report(report):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
-    response = reports_table.delete_item(
-        Key={"ID": report["reportID"]}, ReturnValues="ALL_OLD"
-    )
-    if deleted_item := response.get("Attributes"):
-        print(f"Successfully deleted report from reports table: {deleted_item}")
-        if image_keys := deleted_item.get("imageKeys", []):
-            response = s3.delete_objects(
-                Bucket=PHOTOS_BUCKET_NAME,
-                Delete={"Objects": [{"Key": key} for key in image_keys]},
-            )
-            print(f"Succesfully deleted {len(image_keys)} photos from S3: {response}")
-    else:
-        print(f"Report {report['reportID']} not found in reports table")
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
+    response = reports_table.delete_item(Key={"ID": report["reportID"]})
+    logger.debug("Successfully deleted report from reports table: %s", response)
+
+
+def delete_photos(image_keys):
+    errors = []
+    for i in range(0, len(image_keys), S3_DELETE_BATCH_SIZE):
+        keys = image_keys[i : i + S3_DELETE_BATCH_SIZE]
+        response = s3().delete_objects(
+            Bucket=PHOTOS_BUCKET_NAME,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+        for error in response.get("Errors", []):
+            logger.error(f"Failed to delete photo {error['Key']}: {error['Message']}")
+            errors.append(error)
+    logger.info(f"Succesfully deleted {len(image_keys) - len(errors)} photos from S3")
+    return errors
 
 
 def update_report(report):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
     report_id = report["reportID"]
-    print(f"Updating group {report_id} in reports table ...")
+    logger.info(f"Updating group {report_id} in reports table ...")
     response = reports_table.update_item(
         Key={"ID": report_id},
-        UpdateExpression="SET #status = :status",
+        UpdateExpression="SET #status = :status ADD version :one",
         ExpressionAttributeNames={"#status": "status"},
-        ExpressionAttributeValues={":status": report["status"]},
+        ExpressionAttributeValues={":status": report["status"], ":one": 1},
+    )
+    logger.debug(
+        "Successfully updated report %s in reports table: %s", report_id, response
     )
-    print(f"Successfully updated report {report_id} in reports table: {response}")
 
 
-def group_report(report):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
-    report_id = report["reportID"]
-    group_id = report["groupID"]
+def get_group_status(group_id):
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
     response = reports_table.get_item(Key={"ID": group_id})
     if group := response.get("Item"):
-        status = group["status"]
-    else:
-        status = SUBMITTED_STATUS
+        return group["status"]
+    return SUBMITTED_STATUS
+
+
+def group_report(report, status):
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
+    report_id = report["reportID"]
+    group_id = report["groupID"]
     response = reports_table.update_item(
         Key={"ID": report_id},
-        UpdateExpression="SET groupID = :groupID, #status = :status",
+        UpdateExpression="SET groupID = :groupID, #status = :status ADD version :one",
         ExpressionAttributeNames={"#status": "status"},
         ExpressionAttributeValues={
             ":groupID": group_id,
             ":status": status,
+            ":one": 1,
         },
     )
-    print(f"Successfully assigned report {report_id} to group {group_id}: {response}")
+    logger.debug(
+        "Successfully assigned report %s to group %s: %s", report_id, group_id, response
+    )
 
 
 def ungroup_report(report):
-    reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+    reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
     report_id = report["reportID"]
     response = reports_table.update_item(
         Key={"ID": report_id},
-        UpdateExpression="REMOVE groupID",
+        UpdateExpression="REMOVE groupID ADD version :one",
+        ExpressionAttributeValues={":one": 1},
     )
-    print(f"Successfully removed report {report_id} from group: {response}")
+    logger.debug("Successfully removed report %s from group: %s", report_id, response)
 
 
-def lambda_handler(event, context):
-    print(f"Received event: {event}")
+def process_in_parallel(process_report, reports):
+    # every report is attempted before the first error is raised
+    futures = [executor.submit(process_report, report) for report in reports]
+    for future in futures:
+        future.result()
+
+
+def create_reports(reports):
+    for report in reports:
+        create_report(report)
+
 
-    try:
-        message = json.loads(event["Records"][0]["body"])
-        reports = message["reports"]
+def delete_reports(reports):
+    # the reports are only deleted once all of their photos are gone, otherwise the
+    # message is retried with the reports, and their image keys, still in the table
+    image_keys = get_image_keys(reports)
+    errors = delete_photos(image_keys) if image_keys else []
+    if errors:
+        raise Exception(f"Failed to delete {len(errors)} photos")
 
-        process_report = {
-            CREATE_REPORT_OPERATION: create_report,
-            DELETE_REPORT_OPERATION: delete_report,
-            UPDATE_REPORT_OPERATION: update_report,
-            GROUP_REPORT_OPERATION: group_report,
-            UNGROUP_REPORT_OPERATION: ungroup_report,
-        }[message["operation"]]
+    process_in_parallel(delete_report, reports)
 
-        for report in reports:
-            process_report(report)
 
-    except Exception as error:
-        print(error)
+def update_reports(reports):
+    process_in_parallel(update_report, reports)
 
+
+def group_reports(reports):
+    # the status of every group is looked up once per message
+    statuses = {
+        group_id: get_group_status(group_id)
+        for group_id in {report["groupID"] for report in reports}
+    }
+    process_in_parallel(
+        lambda report: group_report(report, statuses[report["groupID"]]), reports
+    )
+
+
+def ungroup_reports(reports):
+    process_in_parallel(ungroup_report, reports)
+
+
+PROCESS_REPORTS = {
+    CREATE_REPORT_OPERATION: create_reports,
+    UPDATE_REPORT_OPERATION: update_reports,
+    GROUP_REPORT_OPERATION: group_reports,
+    UNGROUP_REPORT_OPERATION: ungroup_reports,
+    DELETE_REPORT_OPERATION: delete_reports,
+}
+
+
+def process_messages(process_reports, messages):
+    failed_message_ids = []
+    for message_id, reports in messages:
+        try:
+            process_reports(reports)
+        except Exception as error:
+            logger.error(f"Failed to process message {message_id}: {error}")
+            failed_message_ids.append(message_id)
+    return failed_message_ids
+
+
+@with_metrics
+def lambda_handler(event, context):
+    log_event(event, context)
+
+    messages, failed_message_ids = [], []
+    for record in event["Records"]:
+        try:
+            message = json.loads(record["body"])
+            if message["operation"] not in PROCESS_REPORTS:
+                raise ValueError(f"unknown operation {message['operation']}")
+            messages.append(
+                (message["operation"], record["messageId"], message["reports"])
+            )
+        except Exception as error:
+            logger.error(f"Failed to parse message {record['messageId']}: {error}")
+            failed_message_ids.append(record["messageId"])
+
+    # messages are processed in the order they arrived, so a later operation on a
+    # report is never applied before an earlier one; only consecutive messages of
+    # the same operation are processed together
+    for operation, run in groupby(messages, key=lambda message: message[0]):
+        run = [(message_id, reports) for _, message_id, reports in run]
+        logger.info(f"Processing {operation} on {len(run)} messages ...")
+        failed_message_ids.extend(process_messages(PROCESS_REPORTS[operation], run))
+
+    logger.info(
+        f"Successfully processed {len(event['Records']) - len(failed_message_ids)} "
+        f"messages, {len(failed_message_ids)} failed"
+    )
+
+    # only the failed messages are returned to the queue
     return {
-        "statusCode": 200,
-        "body": json.dumps(
-            f"Successfully processed {message['operation']} on {len(reports)} reports"
-        ),
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in failed_message_ids
+        ]
     }
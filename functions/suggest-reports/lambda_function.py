@@ -1,19 +1,32 @@
 import os
-import re
 import json
-import boto3
 from botocore.exceptions import ClientError
+from clients import async_search, dynamodb, search
+from documents import INDEX_VECTORS
 from formatters import format_report, DataSource
-from opensearch import opensearch
+from logs import log_event, logger
+from metrics import with_metrics
+from normalizers import normalize_query
+from opensearch import run_searches
+from queries import (
+    REPORT_SOURCE_FIELDS,
+    search_body,
+    similar_reports_query,
+    suggestions_query,
+)
+from vectorizers import vectorize
 
-AWS_REGION = os.environ["AWS_REGION"]
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
-DOMAIN_ENDPOINT = os.environ["DOMAIN_ENDPOINT"]
-DOMAIN_PORT = os.environ.get("DOMAIN_PORT", 443)
 
 DEFAULT_SIZE = 10
+MAX_BATCH_GROUPS = 25
 
-RESOLVED_STATUS = "RESOLVED"
+TEXT_MODE = "text"
+KNN_MODE = "knn"
+HYBRID_MODE = "hybrid"
+
+# weight of lower ranks when the text and knn hits of the hybrid mode are merged
+RANK_CONSTANT = 60
 
 CORS_HEADERS = {
     "Access-Control-Allow-Headers": "Content-Type",
@@ -21,24 +34,44 @@ CORS_HEADERS = {
     "Access-Control-Allow-Methods": "GET,OPTIONS",
 }
 
-dynamodb = boto3.resource("dynamodb")
-search = opensearch(AWS_REGION, DOMAIN_ENDPOINT, DOMAIN_PORT)
-
-
-def normalize(text):
-    return re.sub("[^0-9a-zA-Z]+", " ", text)
-
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
-        groupID = event["pathParameters"].get("groupId")
-        print(f"Retrieving similar reports for group {groupID} ...")
+        params = p if (p := event.get("queryStringParameters")) else {}
+        path_params = p if (p := event.get("pathParameters")) else {}
+
+        mode = params.get("mode", TEXT_MODE)
+        if mode not in [TEXT_MODE, KNN_MODE, HYBRID_MODE]:
+            raise ValueError(f"Unknown suggestion mode: {mode}")
+        # knn suggestions are refused rather than silently answered with text
+        # results while reports are not indexed with vectors
+        if mode in [KNN_MODE, HYBRID_MODE] and not INDEX_VECTORS:
+            return {
+                "statusCode": 400,
+                "headers": CORS_HEADERS,
+                "body": json.dumps(f"Suggestion mode {mode} is not enabled"),
+            }
 
-        reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+        # a comma separated list of groups gets suggestions for all of them at once
+        if group_ids := params.get("groupIds"):
+            group_ids = list(dict.fromkeys(filter(None, group_ids.split(","))))
+            logger.info(f"Retrieving similar reports for groups {group_ids} ...")
+            results = get_batch_suggestions(group_ids, mode)
+            return {
+                "statusCode": 200,
+                "headers": CORS_HEADERS,
+                "body": json.dumps(results),
+            }
+
+        groupID = path_params.get("groupId")
+        logger.info(f"Retrieving similar reports for group {groupID} ...")
+
+        reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
         response = reports_table.get_item(Key={"ID": groupID})
-        print(f"Successfully retrieved group: {response}")
+        logger.debug("Successfully retrieved group: %s", response)
 
         if not (item := response.get("Item")):
             return {
@@ -47,80 +80,147 @@ def lambda_handler(event, context):
                 "body": json.dumps(f"Group {groupID} not found"),
             }
 
-        title_query = normalize(item["title"])
-        description_query = normalize(item["description"])
-
-        query_fields = [
-            "title^4",
-            "keywords^2",
-            "photoLabels^2",
-            "building",
-            "description",
-        ]
-        response = search.search(
-            index="reports",
-            body={
-                "size": DEFAULT_SIZE,
-                "query": {
-                    "bool": {
-                        "must": [
-                            {"term": {"building": item["building"]}},
-                            {
-                                "query_string": {
-                                    "query": title_query,
-                                    "fields": query_fields,
-                                    "boost": 4,
-                                }
-                            },
-                            {
-                                "query_string": {
-                                    "query": description_query,
-                                    "fields": query_fields,
-                                    "boost": 1,
-                                }
-                            },
-                        ],
-                        "should": [
-                            {
-                                "multi_match": {
-                                    "query": title_query,
-                                    "fields": query_fields,
-                                    "boost": 4,
-                                }
-                            }
-                        ],
-                        "must_not": [
-                            {"exists": {"field": "groupID"}},
-                            {"term": {"status": RESOLVED_STATUS}},
-                        ],
-                    }
-                },
-            },
-        )
-        print(f"Successfully retrieved reports from OpenSearch: {response}")
-
-        total = response["hits"]["total"]["value"]
-        suggested_reports = [
-            format_report(hit["_source"], DataSource.OPENSEARCH, True)
-            for hit in response["hits"]["hits"]
-            if "_source" in hit
-        ]
+        bodies = suggestions_bodies(item, mode)
+        if len(bodies) == 1:
+            responses = [
+                search().search(index="reports", body=bodies[0], request_cache=True)
+            ]
+        else:
+            # the text and knn searches of the hybrid mode run at the same time
+            responses = run_searches(
+                *(
+                    async_search().search(
+                        index="reports", body=body, request_cache=True
+                    )
+                    for body in bodies
+                )
+            )
+        logger.debug("Successfully retrieved reports from OpenSearch: %s", responses)
 
         return {
             "statusCode": 200,
             "headers": CORS_HEADERS,
-            "body": json.dumps(
-                {
-                    "total": total,
-                    "reports": suggested_reports,
-                }
-            ),
+            "body": json.dumps(suggestions(responses)),
+        }
+
+    except ValueError as error:
+        logger.error(f"Error: {error}")
+        return {
+            "statusCode": 400,
+            "headers": CORS_HEADERS,
+            "body": json.dumps("Invalid query parameters"),
         }
 
     except ClientError as error:
-        print(error)
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
             "body": json.dumps("An error occurred while suggesting reports"),
         }
+
+
+def text_suggestions_body(item):
+    title_query = normalize_query(item["title"])
+    description_query = normalize_query(item["description"])
+    return search_body(
+        suggestions_query(item["building"], title_query, description_query),
+        DEFAULT_SIZE,
+        REPORT_SOURCE_FIELDS,
+    )
+
+
+def suggestions_bodies(item, mode):
+    # groups are vectorized the same way as reports, from their title and
+    # description; a group without any words falls back to the text query
+    vector = vectorize(item) if mode in [KNN_MODE, HYBRID_MODE] else None
+    if not vector:
+        return [text_suggestions_body(item)]
+
+    knn_body = search_body(
+        similar_reports_query(item["building"], vector, DEFAULT_SIZE),
+        DEFAULT_SIZE,
+        REPORT_SOURCE_FIELDS,
+    )
+    if mode == HYBRID_MODE:
+        return [text_suggestions_body(item), knn_body]
+    return [knn_body]
+
+
+def fuse_hits(responses):
+    # reciprocal rank fusion, text and knn scores are not comparable but ranks are
+    scores, hits = {}, {}
+    for response in responses:
+        for rank, hit in enumerate(response["hits"]["hits"]):
+            scores[hit["_id"]] = scores.get(hit["_id"], 0) + 1 / (RANK_CONSTANT + rank)
+            hits.setdefault(hit["_id"], hit)
+    ranked = sorted(scores, key=lambda id: scores[id], reverse=True)
+    return [hits[id] for id in ranked[:DEFAULT_SIZE]]
+
+
+def suggestions(responses):
+    hits = responses[0]["hits"]["hits"] if len(responses) == 1 else fuse_hits(responses)
+    return {
+        "total": max(response["hits"]["total"]["value"] for response in responses),
+        "reports": [
+            format_report(hit["_source"], DataSource.OPENSEARCH, True)
+            for hit in hits
+            if "_source" in hit
+        ],
+    }
+
+
+def get_groups(group_ids):
+    items = []
+    request_items = {
+        REPORTS_TABLE_NAME: {
+            "Keys": [{"ID": group_id} for group_id in group_ids],
+            "ProjectionExpression": "ID, title, building, description",
+        }
+    }
+    # keys dynamodb could not read in time are handed back to be requested again
+    while request_items:
+        response = dynamodb().batch_get_item(RequestItems=request_items)
+        items.extend(response["Responses"].get(REPORTS_TABLE_NAME, []))
+        request_items = response.get("UnprocessedKeys")
+    return {item["ID"]: item for item in items}
+
+
+def get_batch_suggestions(group_ids, mode):
+    if len(group_ids) > MAX_BATCH_GROUPS:
+        raise ValueError(
+            f"At most {MAX_BATCH_GROUPS} groups can be requested at once, "
+            f"got {len(group_ids)}"
+        )
+
+    groups = get_groups(group_ids)
+    logger.info(f"Successfully retrieved {len(groups)} of {len(group_ids)} groups")
+    found_ids = [group_id for group_id in group_ids if group_id in groups]
+
+    results = {
+        "groups": {},
+        "notFound": [group_id for group_id in group_ids if group_id not in groups],
+    }
+    if not found_ids:
+        return results
+
+    # one header and one body line per search, answered in the same order
+    body, searches_counts = [], []
+    for group_id in found_ids:
+        bodies = suggestions_bodies(groups[group_id], mode)
+        for group_body in bodies:
+            body.append({"index": "reports", "request_cache": True})
+            body.append(group_body)
+        searches_counts.append(len(bodies))
+    response = search().msearch(body=body)
+    logger.info(f"Successfully retrieved reports for {len(found_ids)} groups")
+
+    group_responses = iter(response["responses"])
+    for group_id, searches_count in zip(found_ids, searches_counts):
+        responses = [next(group_responses) for _ in range(searches_count)]
+        if any("error" in r for r in responses):
+            logger.error(f"Failed to suggest reports for group {group_id}: {responses}")
+            results["groups"][group_id] = None
+        else:
+            results["groups"][group_id] = suggestions(responses)
+    return results
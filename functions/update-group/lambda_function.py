@@ -1,6 +1,8 @@
 import os
 import json
-import boto3
+from clients import dynamodb, sqs
+from logs import log_event, logger
+from metrics import with_metrics
 
 REPORTS_TABLE_NAME = os.environ["REPORTS_TABLE_NAME"]
 PROCESS_REPORT_QUEUE_URL = os.environ["PROCESS_REPORT_QUEUE_URL"]
@@ -21,17 +23,15 @@ CORS_HEADERS = {
     "Access-Control-Allow-Methods": "GET,PATCH,DELETE,OPTIONS",
 }
 
-sqs = boto3.client("sqs")
-dynamodb = boto3.resource("dynamodb")
-
 
+@with_metrics
 def lambda_handler(event, context):
-    print(f"Received event: {event}")
+    log_event(event, context)
 
     try:
         group_id = event["pathParameters"]["groupId"]
 
-        reports_table = dynamodb.Table(REPORTS_TABLE_NAME)
+        reports_table = dynamodb().Table(REPORTS_TABLE_NAME)
         items = reports_table.query(
             IndexName=GROUP_INDEX_NAME,
             KeyConditionExpression="groupID = :groupID",
@@ -64,13 +64,13 @@ def lambda_handler(event, context):
         if group["status"] != status:
             send_update_group_message(group_id, status)
         else:
-            print(f"Group {group_id} already has status {status}")
+            logger.info(f"Group {group_id} already has status {status}")
 
         report_ids = [report["ID"] for report in reports if report["status"] != status]
         if report_ids:
             send_update_reports_message(report_ids, status)
         else:
-            print(f"All reports in group {group_id} already have status {status}")
+            logger.info(f"All reports in group {group_id} already have status {status}")
 
         return {
             "statusCode": 200,
@@ -79,7 +79,7 @@ def lambda_handler(event, context):
         }
 
     except Exception as error:
-        print(f"Error: {error}")
+        logger.error(f"Error: {error}")
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
@@ -92,12 +92,12 @@ def send_update_group_message(group_id, status):
         "operation": UPDATE_GROUP_OPERATION,
         "group": {"groupID": group_id, "status": status},
     }
-    print(f"Sending message to process-group-queue: {message}")
-    response = sqs.send_message(
+    logger.debug("Sending message to process-group-queue: %s", message)
+    response = sqs().send_message(
         QueueUrl=PROCESS_GROUP_QUEUE_URL,
         MessageBody=json.dumps(message),
     )
-    print(response)
+    logger.debug("Response: %s", response)
 
 
 def send_update_reports_message(report_ids, status):
@@ -107,12 +107,12 @@ def send_update_reports_message(report_ids, status):
             {"reportID": report_id, "status": status} for report_id in report_ids
         ],
     }
-    print(f"Sending message to process-report-queue: {message}")
-    response = sqs.send_message(
+    logger.debug("Sending message to process-report-queue: %s", message)
+    response = sqs().send_message(
         QueueUrl=PROCESS_REPORT_QUEUE_URL,
         MessageBody=json.dumps(message),
     )
-    print(response)
+    logger.debug("Response: %s", response)
 
 
 def send_ungroup_reports_message(report_ids):
@@ -120,9 +120,9 @@ def send_ungroup_reports_message(report_ids):
         "operation": UNGROUP_REPORT_OPERATION,
         "reports": [{"reportID": report_id} for report_id in report_ids],
     }
-    print(f"Sending message to process-report-queue: {message}")
-    response = sqs.send_message(
+    logger.debug("Sending message to process-report-queue: %s", message)
+    response = sqs().send_message(
         QueueUrl=PROCESS_REPORT_QUEUE_URL,
         MessageBody=json.dumps(message),
     )
-    print(response)
+    logger.debug("Response: %s", response)
@@ -1,112 +1,147 @@
 import os
 import json
-from opensearch import opensearch
+from boto3.dynamodb.types import TypeDeserializer
+from clients import search
+from documents import group_document, report_document
+from logs import log_event, logger
+from metrics import with_metrics
 
-# from sklearn.feature_extraction.text import CountVectorizer
-# from sklearn.decomposition import SparsePCA
+MAX_BULK_BYTES = int(os.environ.get("MAX_BULK_BYTES", 5 * 1024 * 1024))
 
-AWS_REGION = os.environ["AWS_REGION"]
-DOMAIN_ENDPOINT = os.environ["DOMAIN_ENDPOINT"]
-DOMAIN_PORT = os.environ.get("DOMAIN_PORT", 443)
+# fields that are sent as a partial update when nothing else indexed changed
+PARTIAL_UPDATE_FIELDS = {"status", "groupID", "keywords", "vector"}
 
-search = opensearch(AWS_REGION, DOMAIN_ENDPOINT, DOMAIN_PORT)
+deserializer = TypeDeserializer()
 
-# s3 = boto3.client("s3")
-# bucket_name = "cu-fixit-ml"
-# object_key = "vocabulary.txt"
 
-# # Load the vocabulary from the S3 bucket
-# response = s3.get_object(Bucket=bucket_name, Key=object_key)
-# vocab_file_content = response["Body"].read().decode("utf-8")
-# vocabulary = set(vocab_file_content.split("\n"))
+def deserialize(image):
+    return {name: deserializer.deserialize(value) for name, value in image.items()}
 
 
-def lambda_handler(event, context):
-    print(f"Received event: {event}")
+def coalesce_records(records):
+    # group the records of each item in stream order, only the last one is written
+    records_by_id = {}
+    for record in sorted(
+        records, key=lambda record: int(record["dynamodb"]["SequenceNumber"])
+    ):
+        id = record["dynamodb"]["Keys"]["ID"]["S"]
+        records_by_id.setdefault(id, []).append(record)
+    return records_by_id
 
-    documents_counts = 0
 
-    for record in event.get("Records", []):
-        try:
-            id = record["dynamodb"]["Keys"]["ID"]["S"]
-            print(f"Updating index for record {id} ...")
-
-            if id.startswith("GRP-"):
-                if record["eventName"] == "REMOVE":
-                    print(f"Removing {id} from groups index")
-                    search.delete(index="groups", id=id)
-                else:
-                    new_image = record["dynamodb"]["NewImage"]
-                    body = {
-                        "groupID": id,
-                        "title": new_image["title"]["S"],
-                        "building": new_image["building"]["S"],
-                        "description": new_image["description"]["S"],
-                        "status": new_image["status"]["S"],
-                    }
-                    print(f"Adding {id} to groups index: {body}")
-                    search.index(index="groups", id=id, body=body)
-
-            elif id.startswith("RPT-"):
-                if record["eventName"] == "REMOVE":
-                    print(f"Removing {id} from reports index")
-                    search.delete(index="reports", id=id)
-                else:
-                    new_image = record["dynamodb"]["NewImage"]
-                    body = {
-                        "reportID": id,
-                        "userID": new_image["userID"]["S"],
-                        "title": new_image["title"]["S"],
-                        "building": new_image["building"]["S"],
-                        "description": new_image["description"]["S"],
-                        "status": new_image["status"]["S"],
-                        "createdDate": new_image["createdDate"]["S"],
-                    }
-                    if "groupID" in new_image:
-                        body["groupID"] = new_image["groupID"]["S"]
-                    if "keywords" in new_image:
-                        body["keywords"] = " ".join(new_image["keywords"]["SS"])
-                        # record_text += f", {', '.join(new_image['keywords']['SS'])}"
-                    if "photoLabels" in new_image:
-                        body["photoLabels"] = " ".join(new_image["photoLabels"]["SS"])
-                        # record_text += f", {', '.join(new_image['photoLabels']['SS'])}"
-                    print(f"Adding {id} to reports index: {body}")
-                    search.index(index="reports", id=id, body=body)
-
-                    # for attr in ["keywords", "photoLabels"]:
-                    #     if attr in new_image:
-                    #         words = new_image[attr]["SS"]
-                    #         for word in words:
-                    #             vocabulary.add(word.lower())
-
-                    # vectorizer = CountVectorizer(vocabulary=vocabulary)
-                    # # Use the existing checks to build the sequence to vectorize
-                    # record_text = (
-                    #     f"{new_image['title']['S']}, {new_image['building']['S']}"
-                    # )
-
-                    # X = vectorizer.fit_transform([record_text])
-
-                    # Perform Sparse PCA on the generated vector
-                    # n_components = 10
-                    # sparse_pca = SparsePCA(n_components=n_components)
-                    # X_reduced = sparse_pca.fit_transform(X.toarray())
-
-                    # print(f"The vector for report {id} is {X_reduced}")
-                    # TODO index the vector
-
-            documents_counts += 1
+def bulk_action(id, records):
+    if id.startswith("GRP-"):
+        index, document = "groups", group_document
+    elif id.startswith("RPT-"):
+        index, document = "reports", report_document
+    else:
+        logger.info(f"Skipping record {id} with unknown ID prefix")
+        return None
 
-        except Exception as error:
-            print(f"Error processing record: {error}")
+    record = records[-1]
+    if record["eventName"] == "REMOVE":
+        logger.info(f"Removing {id} from {index} index")
+        return [{"delete": {"_index": index, "_id": id}}]
 
-    # sorted_vocabulary = sorted(vocabulary)
-    # vocab_file_content = "\n".join(sorted_vocabulary)
-    # s3.put_object(Bucket=bucket_name, Key=object_key, Body=vocab_file_content)
+    body = document(deserialize(record["dynamodb"]["NewImage"]))
 
+    # diff against the item before the first record when the batch only modified it
+    old_image = records[0]["dynamodb"].get("OldImage")
+    if old_image and all(record["eventName"] == "MODIFY" for record in records):
+        try:
+            old_body = document(deserialize(old_image))
+        except KeyError:
+            old_body = {}
+        changed_fields = {
+            field
+            for field in old_body.keys() | body.keys()
+            if old_body.get(field) != body.get(field)
+        }
+        if not changed_fields:
+            logger.info(f"Skipping {id}, no indexed fields changed")
+            return None
+        if old_body and changed_fields <= PARTIAL_UPDATE_FIELDS:
+            # removed fields are set to null, which the index treats as missing
+            doc = {field: body.get(field) for field in sorted(changed_fields)}
+            logger.debug("Updating %s in %s index: %s", id, index, doc)
+            return [
+                {"update": {"_index": index, "_id": id}},
+                {"doc": doc, "upsert": body},
+            ]
+
+    logger.debug("Adding %s to %s index: %s", id, index, body)
+    return [{"index": {"_index": index, "_id": id}}, body]
+
+
+def bulk_chunks(actions):
+    # split the batch into bulk requests of at most MAX_BULK_BYTES each
+    chunk, chunk_bytes = [], 0
+    for records, action in actions:
+        payload = "".join(f"{json.dumps(line)}\n" for line in action)
+        if chunk and chunk_bytes + len(payload) > MAX_BULK_BYTES:
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append((records, payload))
+        chunk_bytes += len(payload)
+    if chunk:
+        yield chunk
+
+
+def send_bulk(chunk):
+    try:
+        response = search().bulk(body="".join(payload for _, payload in chunk))
+    except Exception as error:
+        logger.error(f"Failed to send bulk request of {len(chunk)} actions: {error}")
+        return [records for records, _ in chunk]
+
+    if not response["errors"]:
+        return []
+
+    # bulk items are returned in the same order as the actions were sent
+    failed_records = []
+    for (records, _), item in zip(chunk, response["items"]):
+        [(operation, result)] = item.items()
+        if operation == "delete" and result["status"] == 404:
+            continue
+        if "error" in result:
+            logger.error(f"Failed to {operation} {result['_id']}: {result['error']}")
+            failed_records.append(records)
+    return failed_records
+
+
+@with_metrics
+def lambda_handler(event, context):
+    log_event(event, context)
+
+    records = event.get("Records", [])
+    records_by_id = coalesce_records(records)
+
+    actions, failed_records = [], []
+    for id, id_records in records_by_id.items():
+        try:
+            if action := bulk_action(id, id_records):
+                actions.append((id_records, action))
+        except Exception as error:
+            logger.error(f"Error processing record {id}: {error}")
+            failed_records.append(id_records)
+
+    documents_counts = len(actions)
+    for chunk in bulk_chunks(actions):
+        failed_chunk_records = send_bulk(chunk)
+        documents_counts -= len(failed_chunk_records)
+        failed_records.extend(failed_chunk_records)
+
+    logger.info(
+        f"Successfully updated or removed {documents_counts} documents, "
+        f"coalesced {len(records) - len(records_by_id)} of {len(records)} records, "
+        f"{len(failed_records)} documents failed"
+    )
+
+    # only the failed records are retried by the DynamoDB stream event source
     return {
-        "statusCode": 200,
-        "body": json.dumps(
-            f"Successfully updated or removed {documents_counts} documents"
-        ),
+        "batchItemFailures": [
+            {"itemIdentifier": record["dynamodb"]["SequenceNumber"]}
+            for id_records in failed_records
+            for record in id_records
+        ]
     }
@@ -1,3 +1,7 @@
+import json
+import hashlib
+
+
 class AuthContext:
     def __init__(self, event, admin_pool_id, user_pool_id):
         authorizer = event["requestContext"]["authorizer"]
@@ -15,3 +19,33 @@ def cors_headers(allow_methods, allow_headers="Content-Type", allow_origin="*"):
         "Access-Control-Allow-Origin": allow_origin,
         "Access-Control-Allow-Methods": allow_methods,
     }
+
+
+# clients revalidate on every poll, and get an empty 304 while nothing changed
+CACHE_CONTROL = "private, no-cache"
+
+
+def item_version(item):
+    # items written before versions were kept are identified by their content
+    return item.get("version", item)
+
+
+def entity_tag(*parts):
+    data = json.dumps(
+        parts,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=lambda value: sorted(value) if isinstance(value, set) else str(value),
+    )
+    return f'"{hashlib.sha1(data.encode("utf-8")).hexdigest()}"'
+
+
+def etag_matches(event, etag):
+    headers = h if (h := event.get("headers")) else {}
+    value = next(
+        (v for name, v in headers.items() if name.lower() == "if-none-match"), None
+    )
+    if not value:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in value.split(",")]
+    return "*" in tags or etag in tags
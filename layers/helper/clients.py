@@ -0,0 +1,98 @@
+import os
+import threading
+from metrics import instrument_async_search, instrument_client, instrument_search
+
+# clients are built on first use and then reused by every invocation of the
+# container, so paths that never call a service do not pay for building its client;
+# their calls are timed for the metrics of the invocation
+
+# handlers first call a service from their worker threads, so a client is built
+# under a lock: the default boto3 session is not thread-safe, and two threads that
+# miss the cache at the same time must not both build and instrument a client
+lock = threading.RLock()
+# boto3 resources are not thread-safe, so every thread builds its own
+local = threading.local()
+
+
+def built_once(factory):
+    built = {}
+
+    def get(*args):
+        if args not in built:
+            with lock:
+                if args not in built:
+                    built[args] = factory(*args)
+        return built[args]
+
+    return get
+
+
+@built_once
+def client(service_name, max_pool_connections=None):
+    import boto3
+    from botocore.config import Config
+
+    config = Config(max_pool_connections=max_pool_connections or 10)
+    return instrument_client(boto3.client(service_name, config=config))
+
+
+def resource(service_name, max_pool_connections=None):
+    resources = local.__dict__.setdefault("resources", {})
+    key = (service_name, max_pool_connections)
+    if key not in resources:
+        import boto3
+        from botocore.config import Config
+
+        config = Config(max_pool_connections=max_pool_connections or 10)
+        with lock:
+            session = boto3.session.Session()
+        resource = session.resource(service_name, config=config)
+        instrument_client(resource.meta.client)
+        resources[key] = resource
+    return resources[key]
+
+
+def dynamodb(max_pool_connections=None):
+    return resource("dynamodb", max_pool_connections)
+
+
+def sqs():
+    return client("sqs")
+
+
+def s3(max_pool_connections=None):
+    return client("s3", max_pool_connections)
+
+
+def comprehend():
+    return client("comprehend")
+
+
+def rekognition():
+    return client("rekognition")
+
+
+@built_once
+def search():
+    from opensearch import opensearch
+
+    return instrument_search(
+        opensearch(
+            os.environ["AWS_REGION"],
+            os.environ["DOMAIN_ENDPOINT"],
+            os.environ.get("DOMAIN_PORT", 443),
+        )
+    )
+
+
+@built_once
+def async_search():
+    from opensearch import async_opensearch
+
+    return instrument_async_search(
+        async_opensearch(
+            os.environ["AWS_REGION"],
+            os.environ["DOMAIN_ENDPOINT"],
+            os.environ.get("DOMAIN_PORT", 443),
+        )
+    )
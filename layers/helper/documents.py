@@ -0,0 +1,39 @@
+import os
+from vectorizers import vectorize
+
+# vectors are only indexed once the knn mapping of the reports index exists, since
+# an index without it maps them as plain floats that knn queries cannot use
+INDEX_VECTORS = os.environ.get("INDEX_VECTORS", "false").lower() == "true"
+
+
+def group_document(item):
+    return {
+        "groupID": item["ID"],
+        "title": item["title"],
+        "building": item["building"],
+        "description": item["description"],
+        "status": item["status"],
+    }
+
+
+def report_document(item):
+    document = {
+        "reportID": item["ID"],
+        "userID": item["userID"],
+        "title": item["title"],
+        "building": item["building"],
+        "description": item["description"],
+        "status": item["status"],
+        "createdDate": item["createdDate"],
+    }
+    if group_id := item.get("groupID"):
+        document["groupID"] = group_id
+    # sets are sorted so the same item always produces the same document
+    if keywords := item.get("keywords"):
+        document["keywords"] = " ".join(sorted(keywords))
+    if photo_labels := item.get("photoLabels"):
+        document["photoLabels"] = " ".join(sorted(photo_labels))
+    # reports without any words to vectorize are left out of similarity searches
+    if INDEX_VECTORS and (vector := vectorize(document)):
+        document["vector"] = vector
+    return document
@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import random
+import logging
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# longest message written, longer ones are cut to keep log ingestion bounded
+LOG_MAX_LENGTH = int(os.environ.get("LOG_MAX_LENGTH", 2048))
+# share of invocations whose full event is written at DEBUG level
+LOG_EVENT_SAMPLE_RATE = float(os.environ.get("LOG_EVENT_SAMPLE_RATE", 0.01))
+
+request_id = None
+
+
+def truncate(message, max_length=LOG_MAX_LENGTH):
+    if len(message) <= max_length:
+        return message
+    return f"{message[:max_length]}... ({len(message) - max_length} more characters)"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "level": record.levelname,
+            "requestId": request_id,
+            "message": truncate(record.getMessage()),
+        }
+        if record.exc_info:
+            entry["exception"] = truncate(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name="cufixit"):
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        # written straight to stdout, the lambda runtime's own root handler is left
+        # alone so lines are not logged twice
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+    return logger
+
+
+logger = get_logger()
+
+
+def log_event(event, context):
+    # tags every following line with the request id, and dumps the full event only
+    # for a sample of the invocations, when DEBUG is enabled
+    global request_id
+    request_id = getattr(context, "aws_request_id", None)
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_EVENT_SAMPLE_RATE:
+        logger.debug("Received event: %s", json.dumps(event, default=str))
+    elif records := event.get("Records"):
+        logger.info(f"Received event with {len(records)} records")
+    else:
+        logger.info(
+            f"Received {event.get('httpMethod', 'event')} {event.get('path', '')}"
+        )
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "CUFixIt")
+FUNCTION_NAME = os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")
+
+cold_start = True
+lock = threading.Lock()
+# values of the current invocation, by metric name
+values = {}
+units = {}
+
+
+def add(name, value, unit="Count"):
+    with lock:
+        values[name] = values.get(name, 0) + value
+        units[name] = unit
+
+
+def record_call(dependency, milliseconds):
+    add(f"{dependency}.Calls", 1)
+    add(f"{dependency}.Latency", milliseconds, "Milliseconds")
+
+
+@contextmanager
+def timed(dependency):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_call(dependency, (time.perf_counter() - started) * 1000)
+
+
+def before_call(model, context, **kwargs):
+    context["metrics_call"] = (model.service_model.service_name, time.perf_counter())
+
+
+def after_call(context, **kwargs):
+    # failed calls are only passed the exception and the context of the request
+    if call := context.pop("metrics_call", None):
+        service, started = call
+        record_call(service, (time.perf_counter() - started) * 1000)
+
+
+def instrument_client(client):
+    # botocore emits these events around every api call of the client
+    client.meta.events.register("before-call", before_call)
+    client.meta.events.register("after-call", after_call)
+    client.meta.events.register("after-call-error", after_call)
+    return client
+
+
+def instrument_search(search, dependency="opensearch"):
+    # every request of the client goes through its transport, which is only
+    # wrapped once even when the same client is instrumented again
+    perform_request = search.transport.perform_request
+    if getattr(perform_request, "timed", False):
+        return search
+
+    @functools.wraps(perform_request)
+    def timed_perform_request(*args, **kwargs):
+        with timed(dependency):
+            return perform_request(*args, **kwargs)
+
+    timed_perform_request.timed = True
+    search.transport.perform_request = timed_perform_request
+    return search
+
+
+def instrument_async_search(search, dependency="opensearch"):
+    perform_request = search.transport.perform_request
+    if getattr(perform_request, "timed", False):
+        return search
+
+    @functools.wraps(perform_request)
+    async def timed_perform_request(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await perform_request(*args, **kwargs)
+        finally:
+            record_call(dependency, (time.perf_counter() - started) * 1000)
+
+    timed_perform_request.timed = True
+    search.transport.perform_request = timed_perform_request
+    return search
+
+
+def add_payload(prefix, payload):
+    # only cheap proxies of the size are recorded, never a serialization of the
+    # whole payload: the body of api requests and responses, or the record count
+    # of batch events
+    if not isinstance(payload, dict):
+        return
+    if isinstance(payload.get("body"), str):
+        add(f"{prefix}Bytes", len(payload["body"]), "Bytes")
+    elif isinstance(payload.get("Records"), list):
+        add(f"{prefix}Records", len(payload["Records"]))
+
+
+def emit(stream=None):
+    # cloudwatch extracts the metrics from this one line of embedded metric format
+    with lock:
+        metrics, metric_units = dict(values), dict(units)
+        values.clear()
+        units.clear()
+    document = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["FunctionName"]],
+                    "Metrics": [
+                        {"Name": name, "Unit": metric_units[name]}
+                        for name in sorted(metrics)
+                    ],
+                }
+            ],
+        },
+        "FunctionName": FUNCTION_NAME,
+        **metrics,
+    }
+    stream = stream or sys.stdout
+    stream.write(f"{json.dumps(document)}\n")
+    return document
+
+
+def with_metrics(handler):
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global cold_start
+        if not METRICS_ENABLED:
+            return handler(event, context)
+
+        add("ColdStart", int(cold_start))
+        cold_start = False
+        add_payload("Request", event)
+        started = time.perf_counter()
+        try:
+            response = handler(event, context)
+            add_payload("Response", response)
+            # handled errors are returned to api gateway as server error responses
+            if isinstance(response, dict) and response.get("statusCode", 0) >= 500:
+                add("Errors", 1)
+            return response
+        except Exception:
+            add("Errors", 1)
+            raise
+        finally:
+            add("Duration", (time.perf_counter() - started) * 1000, "Milliseconds")
+            emit()
+
+    return wrapper
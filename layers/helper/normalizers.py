@@ -0,0 +1,76 @@
+import re
+from functools import lru_cache
+
+WORD_CACHE_SIZE = 8192
+
+NON_ALPHANUMERIC = re.compile("[^0-9a-z]+")
+
+STOP_WORDS = frozenset("""
+    a about above after again against all am an and any are as at be because been
+    before being below between both but by can could did do does doing down during
+    each few for from further had has have having he her here hers herself him
+    himself his how i if in into is it its itself just me more most my myself no
+    nor not now of off on once only or other our ours ourselves out over own same
+    she should so some such than that the their theirs them themselves then there
+    these they this those through to too under until up very was we were what when
+    where which while who whom why will with would you your yours yourself
+    yourselves
+    """.split())
+
+FREQUENT_TERMS = """
+    alarm bathroom bed bulb bus cabinet ceiling chair class clog crack desk door
+    drain elevator faucet fan fire floor fountain gas glass handle heater hole hvac
+    key lamp leak light lock mold noise outlet paint pest pipe plug printer projector
+    radiator roof room shower sink smell socket stain stair switch table tile toilet
+    trash vent wall water wifi window wire
+    """.split()
+
+
+def plural(term):
+    return f"{term}es" if term.endswith(("s", "sh", "ch", "x")) else f"{term}s"
+
+
+# singular forms of frequent maintenance terms, looked up before inflect, which is
+# slow and also mangles some of them (glass -> glas, gas -> ga)
+SINGULAR_FORMS = {
+    **{term: term for term in FREQUENT_TERMS},
+    **{plural(term): term for term in FREQUENT_TERMS},
+    "mice": "mouse",
+}
+
+
+@lru_cache(maxsize=None)
+def inflect_engine():
+    import inflect
+
+    return inflect.engine()
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def singularize(word):
+    if singular := SINGULAR_FORMS.get(word):
+        return singular
+    return singular if (singular := inflect_engine().singular_noun(word)) else word
+
+
+def split_words(text):
+    # lowercase and strip punctuation, dropping stop words
+    return [
+        word
+        for word in NON_ALPHANUMERIC.split(text.lower())
+        if word and word not in STOP_WORDS
+    ]
+
+
+def normalize_words(text):
+    return [singularize(word) for word in split_words(text)]
+
+
+def normalize_query(text):
+    # keep the original words next to their singular forms, so the query still
+    # matches plural words in unnormalized titles and descriptions
+    terms = {}
+    for word in split_words(text):
+        terms[word] = None
+        terms[singularize(word)] = None
+    return " ".join(terms)
@@ -0,0 +1,78 @@
+import json
+import base64
+from logs import logger
+
+# every page request extends the point in time, so it only has to outlive the
+# time between two pages of a client
+PIT_KEEP_ALIVE = "1m"
+
+
+def encode_cursor(position):
+    data = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    # padding is dropped so the cursor can be passed as a query parameter as is
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        data = base64.urlsafe_b64decode(f"{cursor}{'=' * (-len(cursor) % 4)}")
+        position = json.loads(data)
+    except ValueError as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
+    # the cursor is passed on to opensearch, so a malformed one is rejected here
+    # instead of failing the search
+    if (
+        not isinstance(position, dict)
+        or not isinstance(position.get("after", []), list)
+        or not isinstance(position.get("pit"), (str, type(None)))
+    ):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position
+
+
+def page_request(search, index, body, tiebreak, page_from=0, cursor=None, pit=False):
+    # the cursor holds the sort values of the last hit of the previous page and
+    # the point in time the pages are read from, if any
+    position = decode_cursor(cursor) if cursor else {}
+    body = {**body, "sort": [{"_score": "desc"}, {tiebreak: "asc"}]}
+    if search_after := position.get("after"):
+        body["search_after"] = search_after
+    else:
+        body["from"] = page_from
+
+    # a point in time is only opened for the first page; later pages keep reading
+    # the one their cursor holds, and a cursor without one never opens another
+    pit_id = position.get("pit")
+    if pit and cursor and not pit_id:
+        raise ValueError("Cursor does not hold a point in time")
+    if pit and not pit_id:
+        response = search.create_point_in_time(index=index, keep_alive=PIT_KEEP_ALIVE)
+        pit_id = response["pit_id"]
+
+    # searches of a point in time name no index, and return an updated pit id
+    if pit_id:
+        body["pit"] = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+        return None, body
+    return index, body
+
+
+def page_cursor(search, response, body):
+    hits = response["hits"]["hits"]
+    pit_id = response.get("pit_id", body.get("pit", {}).get("id"))
+    if hits and len(hits) == body["size"]:
+        return encode_cursor({"after": hits[-1]["sort"], "pit": pit_id})
+    # the last page closes its point in time, rather than leaving it open on the
+    # nodes until it expires; the page is returned even if that fails
+    if pit_id:
+        try:
+            search.delete_point_in_time(body={"pit_id": [pit_id]})
+        except Exception as error:
+            logger.warning(f"Failed to delete point in time: {error}")
+    return None
+
+
+def search_page(search, index, body, tiebreak, page_from=0, cursor=None, pit=False):
+    index, body = page_request(search, index, body, tiebreak, page_from, cursor, pit)
+    # pages of hits are only kept in the shard request cache when asked to
+    response = search.search(index=index, body=body, request_cache=True)
+    return response, page_cursor(search, response, body)
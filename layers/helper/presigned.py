@@ -0,0 +1,34 @@
+import time
+from functools import lru_cache
+
+PRESIGN_EXPIRATION = 3600
+PRESIGN_CACHE_SIZE = 1024
+
+
+def presign_window(expiration, now=None):
+    # a url is handed out again until the end of the half-expiration window it was
+    # signed in, so it is always returned with at least half its lifetime left
+    now = time.time() if now is None else now
+    return int(now // max(1, expiration // 2))
+
+
+@lru_cache(maxsize=PRESIGN_CACHE_SIZE)
+def _presigned_url(s3, bucket, key, expiration, window):
+    return s3.generate_presigned_url(
+        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expiration
+    )
+
+
+@lru_cache(maxsize=PRESIGN_CACHE_SIZE)
+def _presigned_post(s3, bucket, key, expiration, window):
+    return s3.generate_presigned_post(Bucket=bucket, Key=key, ExpiresIn=expiration)
+
+
+def presigned_url(s3, bucket, key, expiration=PRESIGN_EXPIRATION):
+    # the same url for the same object within a window lets browsers and the cdn
+    # cache the image, and saves signing it on every request
+    return _presigned_url(s3, bucket, key, expiration, presign_window(expiration))
+
+
+def presigned_post(s3, bucket, key, expiration=PRESIGN_EXPIRATION):
+    return _presigned_post(s3, bucket, key, expiration, presign_window(expiration))
@@ -0,0 +1,32 @@
+import math
+import zlib
+from collections import Counter
+from normalizers import normalize_words
+
+VECTOR_DIMENSION = 256
+
+# title and keywords describe the problem better than the free text description
+FIELD_WEIGHTS = {"title": 2.0, "keywords": 2.0, "photoLabels": 1.0, "description": 1.0}
+
+
+def hashed_features(words, weight, features):
+    # crc32 is stable across processes, unlike hash(), so the same text always maps
+    # to the same vector; one bit of the hash picks the sign to cancel collisions
+    for word, count in Counter(words).items():
+        hashed = zlib.crc32(word.encode("utf-8"))
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        features[hashed % VECTOR_DIMENSION] += sign * weight * (1 + math.log(count))
+
+
+def vectorize(fields):
+    # sublinear term frequencies of the normalized words of every field, hashed into
+    # a fixed number of dimensions and scaled to unit length for cosine similarity
+    features = [0.0] * VECTOR_DIMENSION
+    for field, weight in FIELD_WEIGHTS.items():
+        if text := fields.get(field):
+            hashed_features(normalize_words(text), weight, features)
+
+    norm = math.sqrt(sum(value * value for value in features))
+    if not norm:
+        return None
+    return [round(value / norm, 6) for value in features]
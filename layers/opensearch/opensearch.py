@@ -1,22 +1,74 @@
-import boto3
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
+import os
+from functools import lru_cache
 
-credentials = boto3.Session().get_credentials()
+POOL_MAXSIZE = int(os.environ.get("OPENSEARCH_POOL_MAXSIZE", 10))
+CONNECT_TIMEOUT = float(os.environ.get("OPENSEARCH_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = float(os.environ.get("OPENSEARCH_READ_TIMEOUT", 10))
+MAX_CONCURRENT_SEARCHES = int(os.environ.get("OPENSEARCH_MAX_CONCURRENT_SEARCHES", 4))
 
 
-def opensearch(region, endpoint, port):
-    awsauth = AWS4Auth(
-        credentials.access_key,
-        credentials.secret_key,
-        region,
-        "es",
-        session_token=credentials.token,
-    )
+@lru_cache(maxsize=None)
+def opensearch(region, endpoint, port, pool_maxsize=POOL_MAXSIZE):
+    # one client per domain and container, so its pooled keep-alive connections
+    # are reused by every invocation instead of opening a new TLS session each time;
+    # the client library is imported on first use to keep it out of cold starts
+    import boto3
+    from opensearchpy import AWSV4SignerAuth, OpenSearch, RequestsHttpConnection
+
+    credentials = boto3.Session().get_credentials()
     return OpenSearch(
         hosts=[{"host": endpoint, "port": port}],
-        http_auth=awsauth,
+        # requests are signed with the session credentials, which botocore
+        # refreshes before they expire
+        http_auth=AWSV4SignerAuth(credentials, region),
         use_ssl=True,
         verify_certs=True,
         connection_class=RequestsHttpConnection,
+        pool_maxsize=pool_maxsize,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
     )
+
+
+@lru_cache(maxsize=None)
+def event_loop():
+    # the async client's connections belong to the loop they were opened in, so
+    # the same loop runs the searches of every invocation
+    import asyncio
+
+    return asyncio.new_event_loop()
+
+
+@lru_cache(maxsize=None)
+def async_opensearch(region, endpoint, port, pool_maxsize=POOL_MAXSIZE):
+    import boto3
+    from opensearchpy import AsyncHttpConnection, AsyncOpenSearch, AWSV4SignerAsyncAuth
+
+    credentials = boto3.Session().get_credentials()
+    return AsyncOpenSearch(
+        hosts=[{"host": endpoint, "port": port}],
+        http_auth=AWSV4SignerAsyncAuth(credentials, region),
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=AsyncHttpConnection,
+        maxsize=pool_maxsize,
+        # aiohttp only takes a total timeout per request
+        timeout=CONNECT_TIMEOUT + READ_TIMEOUT,
+    )
+
+
+async def gather_searches(searches, limit):
+    import asyncio
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def limited(search):
+        async with semaphore:
+            return await search
+
+    return await asyncio.gather(*(limited(search) for search in searches))
+
+
+def run_searches(*searches, limit=MAX_CONCURRENT_SEARCHES):
+    # run independent searches of the async client at the same time, at most limit
+    # at once, and return their responses in order
+    return event_loop().run_until_complete(gather_searches(searches, limit))
@@ -0,0 +1,207 @@
+RESOLVED_STATUS = "RESOLVED"
+
+FACET_SIZE = 50
+
+# only the fields read by the report and group formatters are returned
+REPORT_SOURCE_FIELDS = [
+    "building",
+    "createdDate",
+    "description",
+    "groupID",
+    "keywords",
+    "photoLabels",
+    "reportID",
+    "status",
+    "title",
+    "userID",
+]
+GROUP_SOURCE_FIELDS = ["building", "description", "groupID", "status", "title"]
+
+REPORT_QUERY_FIELDS = [
+    "title^4",
+    "keywords^4",
+    "photoLabels^2",
+    "building^2",
+    "description",
+]
+GROUP_QUERY_FIELDS = ["title^4", "building^2", "description"]
+SUGGESTION_QUERY_FIELDS = [
+    "title^4",
+    "keywords^2",
+    "photoLabels^2",
+    "building",
+    "description",
+]
+
+
+def bool_query(filter=None, must=None, should=None, must_not=None):
+    # empty clauses are left out so equal requests always produce equal bodies
+    clauses = {}
+    for occur, queries in [
+        ("filter", filter),
+        ("must", must),
+        ("should", should),
+        ("must_not", must_not),
+    ]:
+        if queries:
+            clauses[occur] = queries
+    return {"bool": clauses}
+
+
+def term_filters(**fields):
+    # exact matches do not take part in scoring and are cached per segment
+    return [
+        {"term": {field: value}} for field, value in sorted(fields.items()) if value
+    ]
+
+
+def search_body(query, size, source_fields):
+    return {"size": size, "query": query, "_source": source_fields}
+
+
+def reports_query(
+    query=None, user_id=None, building=None, status=None, only_ungrouped=False
+):
+    return bool_query(
+        filter=term_filters(userID=user_id, building=building, status=status),
+        must=(
+            [{"query_string": {"query": query, "fields": REPORT_QUERY_FIELDS}}]
+            if query
+            else None
+        ),
+        must_not=[{"exists": {"field": "groupID"}}] if only_ungrouped else None,
+    )
+
+
+def groups_query(query=None, building=None, status=None):
+    return bool_query(
+        filter=term_filters(building=building, status=status),
+        must=(
+            [{"query_string": {"query": query, "fields": GROUP_QUERY_FIELDS}}]
+            if query
+            else None
+        ),
+    )
+
+
+def suggestion_filters(building):
+    # suggestions are ungrouped and unresolved reports in the same building
+    return {
+        "filter": term_filters(building=building),
+        "must_not": [
+            {"exists": {"field": "groupID"}},
+            {"term": {"status": RESOLVED_STATUS}},
+        ],
+    }
+
+
+def suggestions_query(building, title_query, description_query):
+    return bool_query(
+        must=[
+            {
+                "query_string": {
+                    "query": title_query,
+                    "fields": SUGGESTION_QUERY_FIELDS,
+                    "boost": 4,
+                }
+            },
+            {
+                "query_string": {
+                    "query": description_query,
+                    "fields": SUGGESTION_QUERY_FIELDS,
+                    "boost": 1,
+                }
+            },
+        ],
+        should=[
+            {
+                "multi_match": {
+                    "query": title_query,
+                    "fields": SUGGESTION_QUERY_FIELDS,
+                    "boost": 4,
+                }
+            }
+        ],
+        **suggestion_filters(building),
+    )
+
+
+def similar_reports_query(building, vector, k):
+    # the filters are applied while searching the graph, so k hits come back even
+    # when most of the nearest reports are grouped, resolved or elsewhere
+    return {
+        "knn": {
+            "vector": {
+                "vector": vector,
+                "k": k,
+                "filter": bool_query(**suggestion_filters(building)),
+            }
+        }
+    }
+
+
+def reports_facets(facets):
+    # counts per building, status and whether the report belongs to a group
+    aggregations = {}
+    for facet in sorted(set(facets)):
+        if facet in ["building", "status"]:
+            aggregations[facet] = {"terms": {"field": facet, "size": FACET_SIZE}}
+        elif facet == "groupState":
+            aggregations[facet] = {
+                "filters": {
+                    "filters": {
+                        "grouped": {"exists": {"field": "groupID"}},
+                        "ungrouped": bool_query(
+                            must_not=[{"exists": {"field": "groupID"}}]
+                        ),
+                    }
+                }
+            }
+        else:
+            raise ValueError(f"Unknown facet: {facet}")
+    return aggregations
+
+
+def facet_counts(aggregations):
+    counts = {}
+    for facet, aggregation in aggregations.items():
+        if "buckets" not in aggregation:
+            continue
+        buckets = aggregation["buckets"]
+        if isinstance(buckets, dict):
+            counts[facet] = {key: b["doc_count"] for key, b in buckets.items()}
+        else:
+            counts[facet] = {b["key"]: b["doc_count"] for b in buckets}
+    return counts
+
+
+def group_stats_body(group_ids):
+    # report counts per group, restricted to the given groups
+    return {
+        "size": 0,
+        "query": bool_query(filter=[{"terms": {"groupID": group_ids}}]),
+        "aggs": {
+            "groups": {
+                "terms": {"field": "groupID", "size": len(group_ids)},
+                "aggs": {
+                    "resolved": {"filter": {"term": {"status": RESOLVED_STATUS}}},
+                    "latestCreatedDate": {
+                        "max": {"field": "createdDate", "format": "MM/dd/yyyy"}
+                    },
+                },
+            }
+        },
+    }
+
+
+def group_stats(aggregations):
+    stats = {}
+    for bucket in aggregations["groups"]["buckets"]:
+        resolved = bucket["resolved"]["doc_count"]
+        stats[bucket["key"]] = {
+            "reportCount": bucket["doc_count"],
+            "openCount": bucket["doc_count"] - resolved,
+            "resolvedCount": resolved,
+            "latestCreatedDate": bucket["latestCreatedDate"].get("value_as_string"),
+        }
+    return stats